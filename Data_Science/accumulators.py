@@ -0,0 +1,204 @@
+import math
+import numpy as np
+
+# Mergeable running statistics for the significance pipeline. Workers fill them
+# per file or per chunk, the parent merges them in any order and grouping
+# (merge is associative), and the goal3 numbers can be read off at any point
+# without a second pass over the data.
+
+
+def calculate_average_and_uncertainty(total, count):
+    if count == 0:
+        return 0, 0
+    average = total / count
+    uncertainty = math.sqrt(total) / count
+    return average, uncertainty
+
+
+class CountAccumulator:
+    # Per-event counts of one quantity: total, number of events and Welford mean/M2
+
+    def __init__(self, n=0, total=0, mean=0.0, m2=0.0):
+        self.n = n
+        self.total = total
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        self.n += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def add_array(self, values):
+        values = np.asarray(values)
+        if len(values) == 0:
+            return self
+        batch_mean = float(values.mean())
+        batch = CountAccumulator(len(values), int(values.sum()), batch_mean, float(((values - batch_mean) ** 2).sum()))
+        return self.merge(batch)
+
+    def merge(self, other):
+        # Chan et al. pairwise update of mean and M2
+        n = self.n + other.n
+        if n == 0:
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.total += other.total
+        return self
+
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    def average_and_uncertainty(self):
+        # Poisson uncertainty on the average, as in goal3
+        return calculate_average_and_uncertainty(self.total, self.n)
+
+    def to_dict(self):
+        return {'n': self.n, 'total': self.total, 'mean': self.mean, 'm2': self.m2}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['n'], data['total'], data['mean'], data['m2'])
+
+
+class JointAccumulator:
+    # Joint (pos, neg) multiplicity distribution as a 2D bincount: counts[p, n] events had p pi+ and n pi-.
+    # Any moment of the two counts, their covariance included, comes off it without touching the events again.
+
+    def __init__(self, counts=None):
+        self.counts = counts if counts is not None else np.zeros((0, 0), dtype=np.int64)
+
+    @property
+    def events(self):
+        return int(self.counts.sum())
+
+    def grow(self, rows, cols):
+        if rows > self.counts.shape[0] or cols > self.counts.shape[1]:
+            grown = np.zeros((max(rows, self.counts.shape[0]), max(cols, self.counts.shape[1])), dtype=np.int64)
+            grown[:self.counts.shape[0], :self.counts.shape[1]] = self.counts
+            self.counts = grown
+
+    def add_events(self, event_pos, event_neg):
+        event_pos = np.asarray(event_pos, dtype=np.int64)
+        event_neg = np.asarray(event_neg, dtype=np.int64)
+        if len(event_pos) == 0:
+            return self
+        rows, cols = int(event_pos.max()) + 1, int(event_neg.max()) + 1
+        batch = np.bincount(event_pos * cols + event_neg, minlength=rows * cols).reshape(rows, cols)
+        self.grow(rows, cols)
+        self.counts[:rows, :cols] += batch
+        return self
+
+    def merge(self, other):
+        rows, cols = other.counts.shape
+        self.grow(rows, cols)
+        self.counts[:rows, :cols] += other.counts
+        return self
+
+    def summary(self):
+        # Sample (ddof=1) moments of pi+, pi- and the net charge Q = N+ - N-
+        n = self.events
+        pos_values = np.arange(self.counts.shape[0], dtype=np.float64)
+        neg_values = np.arange(self.counts.shape[1], dtype=np.float64)
+        pos_marginal = self.counts.sum(axis=1)
+        neg_marginal = self.counts.sum(axis=0)
+        mean_pos = float(pos_marginal @ pos_values) / n if n else 0.0
+        mean_neg = float(neg_marginal @ neg_values) / n if n else 0.0
+        scale = 1 / (n - 1) if n > 1 else 0.0
+        var_pos = float(pos_marginal @ (pos_values - mean_pos) ** 2) * scale
+        var_neg = float(neg_marginal @ (neg_values - mean_neg) ** 2) * scale
+        covariance = float((pos_values - mean_pos) @ self.counts @ (neg_values - mean_neg)) * scale
+        var_net = var_pos + var_neg - 2 * covariance
+        mean_charged = mean_pos + mean_neg
+        return {
+            'events': n,
+            'mean_net': mean_pos - mean_neg,
+            'var_net': var_net,
+            'covariance': covariance,
+            'correlation': covariance / math.sqrt(var_pos * var_neg) if var_pos > 0 and var_neg > 0 else 0.0,
+            # var(Q) / <N+ + N->: 1 for independent Poisson pions, below 1 when charges are produced in pairs
+            'var_net_scaled': var_net / mean_charged if mean_charged > 0 else 0.0,
+        }
+
+    def to_dict(self):
+        # Sparse, since most (pos, neg) cells of a wide table are empty
+        pos, neg = np.nonzero(self.counts)
+        return {'pos': pos.tolist(), 'neg': neg.tolist(), 'count': self.counts[pos, neg].tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        accumulator = cls()
+        if data['count']:
+            accumulator.grow(max(data['pos']) + 1, max(data['neg']) + 1)
+            accumulator.counts[data['pos'], data['neg']] = data['count']
+        return accumulator
+
+
+class PionAccumulator:
+    # Positive and negative pion counts per event, with the goal3 significance on top
+
+    def __init__(self, pos=None, neg=None, joint=None):
+        self.pos = pos if pos is not None else CountAccumulator()
+        self.neg = neg if neg is not None else CountAccumulator()
+        self.joint = joint if joint is not None else JointAccumulator()
+
+    @property
+    def events(self):
+        return self.pos.n
+
+    def add_event(self, pos_count, neg_count):
+        self.pos.add(pos_count)
+        self.neg.add(neg_count)
+        self.joint.add_events([pos_count], [neg_count])
+
+    def add_events(self, event_pos, event_neg):
+        self.pos.add_array(event_pos)
+        self.neg.add_array(event_neg)
+        self.joint.add_events(event_pos, event_neg)
+        return self
+
+    def merge(self, other):
+        self.pos.merge(other.pos)
+        self.neg.merge(other.neg)
+        self.joint.merge(other.joint)
+        return self
+
+    @classmethod
+    def combine(cls, accumulators):
+        total = cls()
+        for accumulator in accumulators:
+            total.merge(accumulator)
+        return total
+
+    def summary(self):
+        avg_pos, unc_pos = self.pos.average_and_uncertainty()
+        avg_neg, unc_neg = self.neg.average_and_uncertainty()
+        mean_diff = avg_pos - avg_neg
+        combined_unc = math.sqrt(unc_pos**2 + unc_neg**2)
+        significance = mean_diff / combined_unc if combined_unc != 0 else 0
+        return {
+            'events': self.events,
+            'avg_pos': avg_pos,
+            'unc_pos': unc_pos,
+            'avg_neg': avg_neg,
+            'unc_neg': unc_neg,
+            'mean_diff': mean_diff,
+            'combined_unc': combined_unc,
+            'significance': significance,
+            'std_pos': math.sqrt(self.pos.variance()),
+            'std_neg': math.sqrt(self.neg.variance()),
+        }
+
+    def to_dict(self):
+        return {'pos': self.pos.to_dict(), 'neg': self.neg.to_dict(), 'joint': self.joint.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        # Results cached before the joint distribution was kept have no 'joint'
+        joint = JointAccumulator.from_dict(data['joint']) if 'joint' in data else None
+        return cls(CountAccumulator.from_dict(data['pos']), CountAccumulator.from_dict(data['neg']), joint)
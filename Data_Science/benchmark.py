@@ -0,0 +1,197 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import goal2
+import particles
+import pion_analysis
+import synthetic
+
+# Benchmark harness for the analysis paths: generates synthetic Set files (see synthetic.py), times
+# read_events (full and subsampled), process_file and the process-pool driver, and
+# prints one JSON document so runs can be compared between releases.
+#
+#   python Data_Science/benchmark.py --files 4 --events 20000 --output bench.json
+
+
+def run_goal2_full(paths):
+    for path in paths:
+        for _ in goal2.read_events(path):
+            pass
+
+
+def run_goal2_window(paths):
+    for path in paths:
+        for _ in goal2.read_events(path, 300, 1000):
+            pass
+
+
+def run_goal2_reservoir(paths):
+    for path in paths:
+        for _ in goal2.read_events(path, 300, mode="reservoir", seed=0):
+            pass
+
+
+def run_goal3_read(paths):
+    for path in paths:
+        for _ in particles.read_events(path):
+            pass
+
+
+def evict_page_cache(paths):
+    # Best effort cold cache: ask the kernel to drop these files' cached pages (Linux only)
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for path in paths:
+        with open(path, "rb") as f:
+            os.fsync(f.fileno())
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def run_goal3_read_cold(paths, read_ahead):
+    evict_page_cache(paths)
+    for path in paths:
+        for _ in particles.read_events(path, read_ahead=read_ahead):
+            pass
+
+
+def run_goal3_process(paths):
+    for file_index, path in enumerate(paths, start=1):
+        pion_analysis.process_file((file_index, path))
+
+
+def run_pool(paths, workers):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(pion_analysis.process_file, list(enumerate(paths, start=1))))
+
+
+def peak_rss_kb(who):
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def measure(queue, target, args):
+    start = time.perf_counter()
+    target(*args)
+    elapsed = time.perf_counter() - start
+    queue.put({
+        'seconds': elapsed,
+        'peak_rss_kb': peak_rss_kb(resource.RUSAGE_SELF),
+        'peak_rss_children_kb': peak_rss_kb(resource.RUSAGE_CHILDREN),
+    })
+
+
+def run_case(target, args, repeat):
+    # Every repetition runs in a fresh process so peak RSS belongs to this case alone
+    context = multiprocessing.get_context("fork")
+    runs = []
+    for _ in range(repeat):
+        queue = context.Queue()
+        process = context.Process(target=measure, args=(queue, target, args))
+        process.start()
+        runs.append(queue.get())
+        process.join()
+    best = min(runs, key=lambda run: run['seconds'])
+    return {
+        'seconds': best['seconds'],
+        'seconds_all': [run['seconds'] for run in runs],
+        'peak_rss_kb': max(run['peak_rss_kb'] for run in runs),
+        'peak_rss_children_kb': max(run['peak_rss_children_kb'] for run in runs),
+    }
+
+
+def run_benchmarks(paths, num_events, num_particles, max_workers, repeat=3):
+    cases = [
+        ('goal2.read_events/full', run_goal2_full, (paths,)),
+        ('goal2.read_events/window-300', run_goal2_window, (paths,)),
+        ('goal2.read_events/reservoir-300', run_goal2_reservoir, (paths,)),
+        ('particles.read_events', run_goal3_read, (paths,)),
+        ('particles.read_events/cold', run_goal3_read_cold, (paths, 0)),
+        ('particles.read_events/cold-read-ahead-4', run_goal3_read_cold, (paths, 4)),
+        ('pion_analysis.process_file', run_goal3_process, (paths,)),
+    ]
+    # Powers of two up to max_workers, plus max_workers itself
+    worker_counts = sorted({2**i for i in range(max_workers.bit_length()) if 2**i <= max_workers} | {max_workers})
+    for workers in worker_counts:
+        cases.append((f'goal3.pool/workers-{workers}', run_pool, (paths, workers)))
+
+    results = []
+    for name, target, args in cases:
+        result = run_case(target, args, repeat)
+        result['name'] = name
+        # Subsampled passes still scan every event, so rates are per scanned event
+        result['events_per_sec'] = num_events / result['seconds']
+        result['particles_per_sec'] = num_particles / result['seconds']
+        results.append(result)
+        print(f"[BENCH] {name}: {result['seconds']:.3f}s, {result['events_per_sec']:.0f} events/s", file=sys.stderr)
+
+    pool_results = [r for r in results if r['name'].startswith('goal3.pool/')]
+    single = pool_results[0]['seconds']
+    for result in pool_results:
+        result['speedup'] = single / result['seconds']
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Data_Science analysis paths on synthetic Set files")
+    parser.add_argument("--files", type=int, default=4, help="number of synthetic Set files")
+    parser.add_argument("--events", type=int, default=20000, help="events per file")
+    parser.add_argument("--mean-particles", type=float, default=15, help="mean particles per event")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1, help="largest pool size to time")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions per case, the fastest one is reported")
+    parser.add_argument("--data-dir", help="keep the generated files here instead of a temporary directory")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = args.data_dir or tmp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        paths = []
+        num_events = 0
+        num_particles = 0
+        for i in range(1, args.files + 1):
+            path = os.path.join(data_dir, f"output-Set{i}.txt")
+            truth = synthetic.write_set_file(path, args.events, ("poisson", args.mean_particles), seed=i)
+            paths.append(path)
+            num_events += truth['events']
+            num_particles += truth['particles']
+
+        report = {
+            'machine': {
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+            },
+            'config': {
+                'files': args.files,
+                'events_per_file': args.events,
+                'mean_particles': args.mean_particles,
+                'total_events': num_events,
+                'total_particles': num_particles,
+                'bytes': sum(os.path.getsize(path) for path in paths),
+                'repeat': args.repeat,
+            },
+            'results': run_benchmarks(paths, num_events, num_particles, args.max_workers, args.repeat),
+        }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+import event_store
+import particles
+import shared_arrays
+import summary_table
+
+# Bootstrap confidence intervals for the pion asymmetry A = (N+ - N-) / (N+ + N-),
+# per batch and over the whole sample. The per-event counts are put in one
+# shared-memory block; workers draw event indices and sum the counts they point
+# at, so no replicate ever copies the events themselves. Events are resampled
+# within their batch (a stratified bootstrap), and every replicate's batch sums
+# also give its global asymmetry. From the command line every file, or every set
+# of a summary table, is bootstrapped on its own, in a fixed order.
+#
+#   python Data_Science/bootstrap.py _Data/output-Set1.txt --replicates 2000 --seed 1
+#   python Data_Science/bootstrap.py --table _Data/summary.table --set 3
+REPLICATES_PER_JOB = 50
+
+
+def asymmetry(pos, neg):
+    pos = np.asarray(pos, dtype=np.float64)
+    neg = np.asarray(neg, dtype=np.float64)
+    total = pos + neg
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, (pos - neg) / total, 0.0)
+
+
+def event_counts(path, batch_size=1000):
+    # Per-event pi+ and pi- counts of a Set file or event store
+    pos_parts = []
+    neg_parts = []
+    for columns in event_store.iter_columns(path, batch_size):
+        event_pos, event_neg = particles.count_pions(columns['pdg'], columns['counts'])
+        pos_parts.append(event_pos)
+        neg_parts.append(event_neg)
+    if not pos_parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(pos_parts), np.concatenate(neg_parts)
+
+
+def resample_job(args):
+    # Worker: `replicates` stratified resamples -> (replicates, num_batches) sums of pi+ and pi-
+    descriptors, batch_size, seed, replicates = args
+    block = shared_arrays.attach(descriptors['pos'][0])
+    try:
+        pos = shared_arrays.column_view(block, descriptors['pos'])
+        neg = shared_arrays.column_view(block, descriptors['neg'])
+        num_events = len(pos)
+        starts = np.arange(0, num_events, batch_size)
+        lengths = np.minimum(batch_size, num_events - starts)
+        # Index i of the replicate is drawn from the batch event i belongs to
+        batch_start = np.repeat(starts, lengths)
+        batch_length = np.repeat(lengths, lengths)
+        rng = np.random.default_rng(seed)
+        pos_sums = np.empty((replicates, len(starts)), dtype=np.int64)
+        neg_sums = np.empty((replicates, len(starts)), dtype=np.int64)
+        for r in range(replicates):
+            index = batch_start + (rng.random(num_events) * batch_length).astype(np.int64)
+            pos_sums[r] = np.add.reduceat(pos[index], starts)
+            neg_sums[r] = np.add.reduceat(neg[index], starts)
+        del pos, neg  # views into the block must go before close()
+        return pos_sums, neg_sums
+    finally:
+        block.close()
+
+
+def interval(samples, confidence):
+    # Percentile interval over the replicate axis
+    tail = 100 * (1 - confidence) / 2
+    low, high = np.percentile(samples, [tail, 100 - tail], axis=0)
+    return low, high
+
+
+def bootstrap(event_pos, event_neg, batch_size=1000, replicates=1000, confidence=0.95, seed=None,
+              executor=None):
+    # event_pos / event_neg: per-event counts, e.g. from event_counts() or kept in memory by goal2
+    event_pos = np.ascontiguousarray(event_pos, dtype=np.int64)
+    event_neg = np.ascontiguousarray(event_neg, dtype=np.int64)
+    if len(event_pos) == 0:
+        raise ValueError("bootstrap needs at least one event")
+    if replicates < 1:
+        raise ValueError("bootstrap needs at least one replicate")
+    # One child seed per job, so the result depends on the seed only, not on the worker count
+    job_sizes = [min(REPLICATES_PER_JOB, replicates - first) for first in range(0, replicates, REPLICATES_PER_JOB)]
+    seeds = np.random.SeedSequence(seed).spawn(len(job_sizes))
+
+    block, descriptors = shared_arrays.share_columns({'pos': event_pos, 'neg': event_neg})
+    try:
+        jobs = [(descriptors, batch_size, child, size) for child, size in zip(seeds, job_sizes)]
+        results = list(executor.map(resample_job, jobs) if executor is not None else map(resample_job, jobs))
+    finally:
+        block.close()
+        block.unlink()
+    pos_sums = np.concatenate([pos for pos, _ in results])
+    neg_sums = np.concatenate([neg for _, neg in results])
+
+    starts = np.arange(0, len(event_pos), batch_size)
+    batch_asym = asymmetry(np.add.reduceat(event_pos, starts), np.add.reduceat(event_neg, starts))
+    batch_samples = asymmetry(pos_sums, neg_sums)
+    global_samples = asymmetry(pos_sums.sum(axis=1), neg_sums.sum(axis=1))
+    batch_low, batch_high = interval(batch_samples, confidence)
+    global_low, global_high = interval(global_samples, confidence)
+    return {
+        'events': len(event_pos),
+        'batch_size': batch_size,
+        'replicates': replicates,
+        'confidence': confidence,
+        'global': {
+            'asymmetry': float(asymmetry(event_pos.sum(), event_neg.sum())),
+            'std': float(global_samples.std(ddof=1)) if replicates > 1 else 0.0,
+            'low': float(global_low),
+            'high': float(global_high),
+        },
+        'batch': {
+            'asymmetry': batch_asym.tolist(),
+            'std': (batch_samples.std(axis=0, ddof=1) if replicates > 1 else np.zeros(len(starts))).tolist(),
+            'low': batch_low.tolist(),
+            'high': batch_high.tolist(),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bootstrap confidence intervals for the pion asymmetry")
+    parser.add_argument("paths", nargs="*", help="Set files or event stores, each bootstrapped on its own")
+    parser.add_argument("--table", help="take the per-event counts from a summary table instead")
+    parser.add_argument("--set", type=int, help="with --table: only this set (default: every set, one by one)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--replicates", type=int, default=1000)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="write the full result as JSON")
+    args = parser.parse_args()
+    if args.replicates < 1:
+        parser.error("--replicates must be at least 1")
+
+    # (label, per-event pi+ counts, pi- counts) per sample; samples are never pooled, so batches
+    # always hold consecutive events of one set
+    samples = []
+    if args.table:
+        table = summary_table.load_table(args.table)
+        sets = [args.set] if args.set is not None else sorted(set(table['set'].tolist()))
+        for set_number in sets:
+            rows = table.where(table['set'] == set_number)
+            # Rows of a set in event order, however the table was written
+            order = np.argsort(rows['event_index'], kind="stable")
+            samples.append((f"set {set_number}", rows['n_pos'][order], rows['n_neg'][order]))
+    elif args.paths:
+        for path in args.paths:
+            samples.append((path, *event_counts(path, args.batch_size)))
+    else:
+        parser.error("give Set files or --table")
+
+    level = f"{100 * args.confidence:g}%"
+    results = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for label, event_pos, event_neg in samples:
+            if len(event_pos) == 0:
+                print(f"[WARN] {label}: no events, skipped")
+                continue
+            result = results[label] = bootstrap(event_pos, event_neg, args.batch_size, args.replicates,
+                                                args.confidence, args.seed, executor)
+            summary = result['global']
+            print(f"[INFO] {label}: {result['events']} events, {args.replicates} replicates")
+            print(f"Global asymmetry: {summary['asymmetry']:.6f} ± {summary['std']:.6f} "
+                  f"({level} CI [{summary['low']:.6f}, {summary['high']:.6f}])")
+            batches = result['batch']
+            for i, (value, low, high) in enumerate(zip(batches['asymmetry'], batches['low'], batches['high'])):
+                print(f"  batch {i:>4}: {value:+.5f}  [{low:+.5f}, {high:+.5f}]")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] Bootstrap results written to {args.output}")
@@ -0,0 +1,175 @@
+import os
+import numpy as np
+
+import accumulators
+import event_index
+import particles
+import pion_analysis
+import profiling
+import progress
+import set_io
+import set_records
+
+# Splits one Set file into byte ranges that start on event headers, so a single
+# large file can be spread over several workers and merged back exactly.
+
+
+def is_header(line):
+    parts = line.split()
+    if len(parts) != 2:
+        return False
+    try:
+        int(parts[0])
+        int(parts[1])
+    except ValueError:
+        return False
+    return True
+
+
+def next_header_offset(f, offset, size):
+    # First header line starting at or after offset (size if there is none)
+    if offset <= 0:
+        f.seek(0)
+        position = 0
+    else:
+        # Step back one byte so a header starting exactly at offset is not skipped
+        f.seek(offset - 1)
+        position = offset - 1 + len(f.readline())
+    while position < size:
+        line = f.readline()
+        if not line:
+            break
+        if is_header(line):
+            return position
+        position += len(line)
+    return size
+
+
+def find_chunks(path, num_chunks):
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    if event_index.is_index_current(path):
+        # The sidecar index already knows every header, so no scanning is needed
+        index = event_index.load_index(path)
+        return [(start, end) for _, _, start, end in event_index.split_event_ranges(index, num_chunks, size)]
+    num_chunks = max(1, min(num_chunks, size))
+    with open(path, "rb") as f:
+        boundaries = [0]
+        for i in range(1, num_chunks):
+            offset = next_header_offset(f, size * i // num_chunks, size)
+            if offset > boundaries[-1]:
+                boundaries.append(offset)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries[:-1], boundaries[1:]) if start < end]
+
+
+def read_events_range(filename, start, end, batch_size=1000, strict=None, report=None):
+    # Like particles.read_event_blocks, but only for events whose header starts in [start, end).
+    # The particle lines of the last event may run past end.
+    with open(filename, "rb") as f:
+        f.seek(start)
+        batch = []
+        for _, event_id, block in set_records.iter_records(f, filename, strict, report, start, end, raw=True):
+            batch.append((event_id, block))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+@profiling.cprofiled
+def process_chunk(args, settings=None):
+    # args: (file_index, path, start, end) with an optional tuple of species names to count;
+    # settings as for pion_analysis.process_file
+    settings = settings or {}
+    file_index, path, start, end = args[:4]
+    species_names = args[4] if len(args) > 4 else ()
+    species_totals = dict.fromkeys(species_names, 0)
+    event_pos_parts = []
+    event_neg_parts = []
+    stats = accumulators.PionAccumulator()
+    stopped = False
+    failed = False
+    report = set_records.ReadReport()
+    profile = profiling.start(f"{path} @{start}", settings.get('profile'))
+    try:
+        for batch in profile.iterate('read', read_events_range(path, start, end, strict=settings.get('strict'),
+                                                               report=report)):
+            pdg, counts = particles.batch_pdg_array(batch)
+            profile.lap('pdg')
+            event_pos, event_neg = particles.count_pions(pdg, counts)
+            profile.lap('count')
+            pion_analysis.add_species_totals(species_totals, pdg)
+            profile.lap('species')
+            stats.add_events(event_pos, event_neg)
+            event_pos_parts.append(event_pos.astype(np.int32))
+            event_neg_parts.append(event_neg.astype(np.int32))
+            profile.lap('stats')
+            if progress.report((file_index, start), path, stats):
+                stopped = True
+                break
+            profile.lap('progress')
+    except (set_records.MalformedRecordError,) + set_io.READ_ERRORS as error:  # the whole file fails in merge_chunks
+        report.error(f"{type(error).__name__}: {error}")
+        failed = True
+    progress.report((file_index, start), path, stats, final=True)
+    profile.finish(stats.events, end - start)
+    return profiling.attach({
+        'file_index': file_index,
+        'path': path,
+        'start': start,
+        'end': end,
+        'event_pos': np.concatenate(event_pos_parts) if event_pos_parts else np.zeros(0, dtype=np.int32),
+        'event_neg': np.concatenate(event_neg_parts) if event_neg_parts else np.zeros(0, dtype=np.int32),
+        'stats': stats.to_dict(),
+        'stopped': stopped,
+        'failed': failed,
+        'species': species_totals,
+        'read_report': report.to_dict(),
+    }, profile)
+
+
+def batch_sums(per_event, batch_size=1000):
+    if len(per_event) == 0:
+        return []
+    return [int(x) for x in np.add.reduceat(per_event.astype(np.int64), np.arange(0, len(per_event), batch_size))]
+
+
+def covers_file(path, chunk_results):
+    # True when the chunks' byte ranges (in file order) run from 0 to the end of the file without a gap
+    position = 0
+    for r in chunk_results:
+        if r['start'] != position:
+            return False
+        position = r['end']
+    return position == os.path.getsize(path)
+
+
+def merge_chunks(file_index, path, chunk_results, batch_size=1000, species_names=()):
+    # Chunks are put back in file order, so the batches line up with a single-pass run.
+    # Chunks that never ran (cancelled by an early stop) leave a gap, and the result is marked stopped.
+    chunk_results = sorted(chunk_results, key=lambda r: r['start'])
+    report = set_records.ReadReport()
+    for r in chunk_results:
+        report.merge(set_records.ReadReport.from_dict(r['read_report']))
+    if any(r['failed'] for r in chunk_results):
+        return pion_analysis.failed_result(file_index, path, None, species_names, report)
+    event_pos = np.concatenate([r['event_pos'] for r in chunk_results]) if chunk_results else np.zeros(0, dtype=np.int32)
+    event_neg = np.concatenate([r['event_neg'] for r in chunk_results]) if chunk_results else np.zeros(0, dtype=np.int32)
+    # Chunk statistics merge associatively, so the file's stats need no pass over event_pos/event_neg
+    stats = accumulators.PionAccumulator.combine(
+        accumulators.PionAccumulator.from_dict(r['stats']) for r in chunk_results)
+    result = pion_analysis.build_result(file_index, path, int(event_pos.sum()), int(event_neg.sum()), len(event_pos),
+                                        batch_sums(event_pos, batch_size), batch_sums(event_neg, batch_size),
+                                        stats.to_dict())
+    species_totals = dict.fromkeys(species_names, 0)
+    for r in chunk_results:
+        for name, count in r['species'].items():
+            species_totals[name] = species_totals.get(name, 0) + count
+    stopped = any(r.get('stopped') for r in chunk_results) or not covers_file(path, chunk_results)
+    result = pion_analysis.finish_result(result, stopped, species_totals, report)
+    if any('profile' in r for r in chunk_results):
+        result['profile'] = [profile for r in chunk_results for profile in r.get('profile', [])]
+    return result
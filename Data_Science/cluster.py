@@ -0,0 +1,283 @@
+import argparse
+import multiprocessing
+import os
+import secrets
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing.managers import BaseManager
+
+import chunking
+import pion_analysis
+import set_io
+
+# goal3 over several machines. The coordinator (goal3.py --coordinator HOST:PORT)
+# serves a board of work units, whole files or byte-range chunks, through a
+# multiprocessing manager; workers on any box that sees the same _Data paths
+# lease units, run the usual process_file / process_chunk in a local pool and
+# hand the result dicts back. Leases are renewed while a unit runs, so a worker
+# that dies simply lets its units expire and they go to someone else. Results
+# are merged exactly like the single-host run (chunking.merge_chunks).
+#
+#   box A:  python Data_Science/goal3.py --coordinator 0.0.0.0:50555
+#   box B:  python Data_Science/cluster.py 10.0.0.1:50555 --workers 16
+#   one box, for testing:  python Data_Science/goal3.py --coordinator 127.0.0.1:0 --local-workers 3
+#
+# Both sides need the same GOAL3_AUTHKEY in their environment. Without one, the
+# coordinator makes up a random key and prints it for the workers.
+LEASE_SECONDS = 30.0
+MAX_ATTEMPTS = 3
+
+
+def default_authkey():
+    # GOAL3_AUTHKEY, or None when it is not set
+    key = os.environ.get("GOAL3_AUTHKEY")
+    return key.encode() if key else None
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class UnitFailed(Exception):
+    pass
+
+
+# === Coordonator ===
+def build_units(jobs, species_names=(), chunks_per_file=1):
+    # jobs: (file_index, path) pairs. Uncompressed text files are cut into chunks, the rest go whole.
+    units = []
+    for file_index, path in jobs:
+        if chunks_per_file > 1 and os.path.isfile(path) and not set_io.is_compressed(path):
+            units.extend(('chunk', file_index, path, start, end, species_names)
+                         for start, end in chunking.find_chunks(path, chunks_per_file))
+        else:
+            units.append(('file', file_index, path, species_names))
+    return units
+
+
+class WorkBoard:
+    # Lives in the coordinator; workers call it through manager proxies, hence the lock
+
+    def __init__(self, units, settings=None, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.units = list(units)
+        self.worker_settings = settings or {}
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.queue = deque(range(len(self.units)))
+        self.leases = {}  # unit id -> (worker, deadline)
+        self.attempts = [0] * len(self.units)
+        self.results = {}  # unit id -> result dict, or UnitFailed once every attempt failed
+        self.lock = threading.Lock()
+
+    def settings(self):
+        return self.worker_settings
+
+    def take(self, worker):
+        # (unit id, unit), or None when nothing is free right now
+        with self.lock:
+            self.expire()
+            if not self.queue:
+                return None
+            unit_id = self.queue.popleft()
+            self.attempts[unit_id] += 1
+            self.leases[unit_id] = (worker, time.monotonic() + self.lease_seconds)
+            return unit_id, self.units[unit_id]
+
+    def renew(self, unit_ids, worker):
+        with self.lock:
+            deadline = time.monotonic() + self.lease_seconds
+            for unit_id in unit_ids:
+                if self.leases.get(unit_id, (None,))[0] == worker:
+                    self.leases[unit_id] = (worker, deadline)
+
+    def complete(self, unit_id, result):
+        with self.lock:
+            if unit_id in self.results:
+                return  # a retried copy got there first
+            self.leases.pop(unit_id, None)
+            if result.get('failed'):
+                errors = "; ".join(result.get('read_report', {}).get('errors', []))
+                self.retry_or_give_up(unit_id, result, f"unit {unit_id} failed: {errors}")
+            else:
+                self.results[unit_id] = result
+
+    def fail(self, unit_id, worker, message):
+        with self.lock:
+            if unit_id in self.results:
+                return
+            self.leases.pop(unit_id, None)
+            self.retry_or_give_up(unit_id, UnitFailed(message), f"unit {unit_id} raised on {worker}: {message}")
+
+    def retry_or_give_up(self, unit_id, final, message):
+        if self.attempts[unit_id] < self.max_attempts:
+            print(f"[WARN] {message}; retrying (attempt {self.attempts[unit_id] + 1} of {self.max_attempts})")
+            self.queue.appendleft(unit_id)
+        else:
+            print(f"[ERROR] {message}; giving up after {self.attempts[unit_id]} attempts")
+            self.results[unit_id] = final
+
+    def expire(self):
+        now = time.monotonic()
+        for unit_id, (worker, deadline) in list(self.leases.items()):
+            if deadline < now:
+                del self.leases[unit_id]
+                self.retry_or_give_up(unit_id, UnitFailed(f"lease expired on {worker}"),
+                                      f"unit {unit_id}: lease on {worker} expired")
+
+    def finished(self):
+        with self.lock:
+            self.expire()
+            return len(self.results) == len(self.units)
+
+    def progress(self):
+        with self.lock:
+            return len(self.results), len(self.units)
+
+
+class CoordinatorManager(BaseManager):
+    pass
+
+
+def merge_units(units, results):
+    # Same file results as the local pool: whole-file results as they are, chunks through merge_chunks
+    merged = []
+    chunk_results = {}
+    failures = {}
+    for unit_id, unit in enumerate(units):
+        kind, file_index, path, species_names = unit[0], unit[1], unit[2], unit[-1]
+        result = results[unit_id]
+        if isinstance(result, UnitFailed):
+            failures.setdefault((file_index, path), (result, species_names))
+        elif kind == 'file':
+            merged.append(result)
+        else:
+            chunk_results.setdefault((file_index, path, species_names), []).append(result)
+    for (file_index, path, species_names), parts in chunk_results.items():
+        if (file_index, path) not in failures:
+            merged.append(chunking.merge_chunks(file_index, path, parts, species_names=species_names))
+    for (file_index, path), (error, species_names) in failures.items():
+        merged.append(pion_analysis.failed_result(file_index, path, error, species_names))
+    return merged
+
+
+def run_coordinator(units, address, authkey=None, settings=None, local_workers=0, slots=None,
+                    lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS, poll=0.5):
+    # Serves the board until every unit has a result; returns the merged file results
+    if authkey is None:
+        authkey = default_authkey()
+    if authkey is None:
+        # Anyone who can reach the port could otherwise hand this process pickles
+        authkey = secrets.token_hex(16).encode()
+        print(f"[INFO] GOAL3_AUTHKEY is not set; start the workers with GOAL3_AUTHKEY={authkey.decode()}")
+    board = WorkBoard(units, settings, lease_seconds, max_attempts)
+
+    # A manager class of its own per run, so CoordinatorManager's registry never holds an old board
+    class RunManager(CoordinatorManager):
+        pass
+
+    RunManager.register('board', callable=lambda: board)
+    server = RunManager(address=address, authkey=authkey).get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[INFO] Coordinator at {server.address[0]}:{server.address[1]} with {len(units)} work unit(s)")
+
+    local = [multiprocessing.Process(target=run_worker, args=(server.address, authkey, slots))
+             for _ in range(local_workers)]
+    for process in local:
+        process.start()
+    try:
+        while not board.finished():
+            time.sleep(poll)
+        for process in local:
+            process.join()
+    finally:
+        for process in local:
+            if process.is_alive():
+                process.terminate()
+        # serve_forever creates stop_event once it runs; setting it ends the server thread
+        if hasattr(server, 'stop_event'):
+            server.stop_event.set()
+    return merge_units(board.units, board.results)
+
+
+# === Worker ===
+class ClusterManager(BaseManager):
+    pass
+
+
+ClusterManager.register('board')
+
+
+def run_unit(unit, settings=None):
+    # settings: the run's options, handed to every unit rather than inherited by the workers:
+    # strict, read_ahead, decode_workers, profile and cprofile_dir (any of them may be left out)
+    if unit[0] == 'file':
+        return pion_analysis.process_file(unit[1:], settings=settings)
+    return chunking.process_chunk(unit[1:], settings=settings)
+
+
+def connect(address, authkey, timeout=30.0):
+    # The coordinator may still be starting up
+    deadline = time.monotonic() + timeout
+    while True:
+        manager = ClusterManager(address=address, authkey=authkey)
+        try:
+            manager.connect()
+            return manager
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+def run_worker(address, authkey=None, slots=None, poll=0.5):
+    # Keeps up to `slots` units running locally until the coordinator has every result
+    if authkey is None:
+        authkey = default_authkey()
+    if authkey is None:
+        raise ValueError("set GOAL3_AUTHKEY to the coordinator's key")
+    slots = slots or os.cpu_count() or 1
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    board = connect(address, authkey).board()
+    settings = board.settings()
+    done = 0
+    try:
+        with ProcessPoolExecutor(max_workers=slots) as executor:
+            in_flight = {}
+            while True:
+                while len(in_flight) < slots:
+                    taken = board.take(name)
+                    if taken is None:
+                        break
+                    unit_id, unit = taken
+                    in_flight[executor.submit(run_unit, unit, settings)] = unit_id
+                if not in_flight:
+                    if board.finished():
+                        break
+                    time.sleep(poll)
+                    continue
+                finished, _ = wait(in_flight, timeout=poll, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    unit_id = in_flight.pop(future)
+                    try:
+                        board.complete(unit_id, future.result())
+                        done += 1
+                    except Exception as error:  # the unit, not the worker, failed; the coordinator retries it
+                        board.fail(unit_id, name, f"{type(error).__name__}: {error}")
+                board.renew(list(in_flight.values()), name)
+    except (EOFError, ConnectionError):
+        pass  # the coordinator finished and went away
+    print(f"[INFO] Worker {name} done after {done} unit(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="goal3 cluster worker")
+    parser.add_argument("coordinator", help="HOST:PORT of a goal3.py --coordinator run")
+    parser.add_argument("--workers", type=int, help="units run in parallel on this box (default: all cores)")
+    args = parser.parse_args()
+    if default_authkey() is None:
+        parser.error("set GOAL3_AUTHKEY to the key the coordinator uses (it prints one when it made it up)")
+    run_worker(parse_address(args.coordinator), slots=args.workers)
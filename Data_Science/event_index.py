@@ -0,0 +1,166 @@
+import json
+import os
+import random
+import sys
+import numpy as np
+
+import result_cache
+import set_io
+import set_records
+
+# Sidecar index for a Set file: one row per event with its id, the byte offset
+# of its header line and the number of particle lines that follow, plus the ids
+# in ascending order (sorted_id) with the row each came from (by_id) for lookups.
+# It sits next to the data as output-SetN.txt.idx.npy, with the data file's size
+# and mtime in output-SetN.txt.idx.json, and is rebuilt when either differs.
+INDEX_SUFFIX = ".idx.npy"
+FINGERPRINT_SUFFIX = ".idx.json"
+INDEX_DTYPE = np.dtype([('event_id', np.int64), ('offset', np.int64), ('num_particles', np.int32),
+                        ('sorted_id', np.int64), ('by_id', np.int64)])
+
+
+def index_path_for(path):
+    return path + INDEX_SUFFIX
+
+
+def fingerprint_path_for(index_path):
+    return index_path[:-len(INDEX_SUFFIX)] + FINGERPRINT_SUFFIX
+
+
+def build_index(path, index_path=None):
+    if set_io.is_compressed(path):
+        raise ValueError(f"{path}: byte offsets need an uncompressed Set file")
+    if index_path is None:
+        index_path = index_path_for(path)
+    fingerprint = result_cache.file_fingerprint(path)  # before the scan, so a file changed during it is rebuilt
+    # The records set_records yields, so the index agrees with the readers about what an event is:
+    # malformed and truncated records are left out, like a header that is not two integers
+    event_ids = []
+    offsets = []
+    counts = []
+    with open(path, "rb") as f:
+        for _, event_id, block in set_records.iter_records(f, path, strict=False, raw=True, offsets=offsets):
+            event_ids.append(event_id)
+            counts.append(block.count(b"\n"))
+
+    index = np.zeros(len(event_ids), dtype=INDEX_DTYPE)
+    index['event_id'] = event_ids
+    index['offset'] = offsets
+    index['num_particles'] = counts
+    # Stable, so the first of several events with the same id is the one found
+    index['by_id'] = np.argsort(index['event_id'], kind='stable')
+    index['sorted_id'] = index['event_id'][index['by_id']]
+    # np.save appends .npy itself unless it is already there, which INDEX_SUFFIX guarantees
+    tmp_path = index_path[:-len(".npy")] + ".tmp.npy"
+    np.save(tmp_path, index)
+    os.replace(tmp_path, index_path)
+    # The fingerprint goes last: an index without a matching one is rebuilt
+    fingerprint_path = fingerprint_path_for(index_path)
+    with open(fingerprint_path + ".tmp", "w") as f:
+        json.dump(fingerprint, f)
+    os.replace(fingerprint_path + ".tmp", fingerprint_path)
+    return index
+
+
+def is_index_current(path, index_path=None):
+    if index_path is None:
+        index_path = index_path_for(path)
+    # Size and mtime both: a file rewritten within the mtime resolution (or copied in with an older
+    # mtime) still has a different size or mtime than the one indexed
+    if not os.path.isfile(index_path):
+        return False
+    try:
+        with open(fingerprint_path_for(index_path)) as f:
+            indexed = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return indexed == result_cache.file_fingerprint(path)
+
+
+def load_index(path, rebuild=True):
+    index_path = index_path_for(path)
+    if not is_index_current(path, index_path):
+        if not rebuild:
+            return None
+        return build_index(path, index_path)
+    return np.load(index_path, mmap_mode="r")
+
+
+def read_at(f, offset, num_events=1):
+    # Reads num_events consecutive events starting at the header at offset, skipping malformed records
+    f.seek(offset)
+    events = []
+    for _, event_id, particle_lines in set_records.iter_records(f, strict=False, start=offset):
+        events.append((event_id, particle_lines))
+        if len(events) == num_events:
+            break
+    return events
+
+
+def read_event(path, event_id, index=None):
+    # Returns (event_id, particles) like read_events, or None if the id is not in the file
+    if index is None:
+        index = load_index(path)
+    sorted_ids = index['sorted_id']
+    position = int(np.searchsorted(sorted_ids, event_id))
+    if position == len(index) or sorted_ids[position] != event_id:
+        return None
+    with open(path, "rb") as f:
+        return read_at(f, int(index['offset'][index['by_id'][position]]))[0]
+
+
+def read_event_range(path, first, last, index=None):
+    # Events at positions first..last-1 in file order, read with a single seek
+    if index is None:
+        index = load_index(path)
+    first = max(0, first)
+    last = min(last, len(index))
+    if first >= last:
+        return
+    with open(path, "rb") as f:
+        for event in read_at(f, int(index['offset'][first]), last - first):
+            yield event
+
+
+def sample_events(path, sample_size, seed=None, index=None):
+    # Uniform sample without replacement, one seek per chosen event, returned in file order
+    if index is None:
+        index = load_index(path)
+    k = min(sample_size, len(index))
+    positions = sorted(random.Random(seed).sample(range(len(index)), k))
+    with open(path, "rb") as f:
+        return [read_at(f, int(index['offset'][i]))[0] for i in positions]
+
+
+def split_event_ranges(index, num_parts, file_size):
+    # Splits the events into num_parts contiguous ranges with about the same number of lines.
+    # Returns (first, last, start_byte, end_byte) tuples; the byte ranges are the ones
+    # chunking.read_events_range expects, so workers can start without rescanning. Together they
+    # cover the whole file from byte 0, so whatever lies outside the indexed events is still read.
+    num_events = len(index)
+    if num_events == 0:
+        return [(0, 0, 0, file_size)] if file_size else []
+    lines = np.cumsum(index['num_particles'].astype(np.int64) + 1)
+    targets = lines[-1] * np.arange(1, num_parts) / num_parts
+    cuts = np.unique(np.concatenate(([0], np.searchsorted(lines, targets, side='right'), [num_events])))
+    ranges = []
+    for first, last in zip(cuts[:-1], cuts[1:]):
+        start = int(index['offset'][first]) if first > 0 else 0
+        end = int(index['offset'][last]) if last < num_events else file_size
+        ranges.append((int(first), int(last), start, end))
+    return ranges
+
+
+if __name__ == "__main__":
+    # python Data_Science/event_index.py _Data/output-Set7.txt [event_id]
+    path = sys.argv[1]
+    index = load_index(path)
+    print(f"[INFO] {path}: {len(index)} events indexed in {index_path_for(path)}")
+    if len(sys.argv) > 2:
+        event = read_event(path, int(sys.argv[2]), index)
+        if event is None:
+            print(f"[ERROR] Event {sys.argv[2]} not found")
+        else:
+            print(f"{event[0]} {len(event[1])}")
+            for p_line in event[1]:
+                print(p_line)
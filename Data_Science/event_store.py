@@ -0,0 +1,170 @@
+import json
+import os
+import sys
+import numpy as np
+
+import particles
+import result_cache
+import set_io
+
+# Columnar event store: one raw binary file per column plus a small meta.json.
+# offsets has num_events + 1 entries; particles of event i are offsets[i]:offsets[i + 1].
+# meta.json also holds the fingerprint of the text file it was converted from, so a
+# store is only used while that file is unchanged (see choose_path).
+STORE_SUFFIX = ".store"
+COLUMNS = {
+    'event_id': np.int64,
+    'offsets': np.int64,
+    'px': np.float64,
+    'py': np.float64,
+    'pz': np.float64,
+    'pdg': np.int32,
+}
+
+
+class DamagedStoreError(ValueError):
+    pass
+
+
+def store_path_for(txt_path):
+    for suffix in set_io.COMPRESSED_SUFFIXES:
+        if txt_path.endswith(suffix):
+            txt_path = txt_path[:-len(suffix)]
+    root, _ = os.path.splitext(txt_path)
+    return root + STORE_SUFFIX
+
+
+def is_store(path):
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+
+def choose_path(txt_path):
+    # The event store converted from txt_path while the text file is still what it was converted
+    # from, otherwise txt_path itself. A store whose text file is gone is used as it is.
+    store_path = store_path_for(txt_path)
+    if not is_store(store_path):
+        return txt_path
+    if not os.path.exists(txt_path):
+        return store_path
+    try:
+        with open(os.path.join(store_path, "meta.json"), "r") as f:
+            converted_from = json.load(f).get('source_fingerprint')
+    except (OSError, ValueError, AttributeError):
+        converted_from = None
+    if converted_from == result_cache.file_fingerprint(txt_path):
+        return store_path
+    print(f"[WARN] {store_path} was converted from another version of {txt_path}; reading the text file "
+          f"(convert it again with event_store.py)")
+    return txt_path
+
+
+def parse_particle(p_line):
+    # pdg follows particles.pdg_code_of, so bad lines never count as pions
+    pdg_code = particles.pdg_code_of(p_line)
+    if not -2**31 <= pdg_code < 2**31:
+        pdg_code = 0  # does not fit the int32 column and is not a pion anyway
+    parts = p_line.split()
+    try:
+        px, py, pz = float(parts[0]), float(parts[1]), float(parts[2])
+    except (ValueError, IndexError):
+        px = py = pz = float('nan')
+    return px, py, pz, pdg_code
+
+
+def batch_columns(batch):
+    # One read_event_blocks batch as column arrays: counts per event, then px, py, pz, pdg per particle
+    decoded = particles.decode_particles(batch)
+    if decoded is not None:
+        momenta, pdg = decoded
+        columns = [momenta[:, 0], momenta[:, 1], momenta[:, 2], np.where((pdg >= -2**31) & (pdg < 2**31), pdg, 0)]
+    else:
+        rows = [parse_particle(p_line) for p_line in particles.batch_lines(batch)]
+        columns = list(zip(*rows)) if rows else [(), (), (), ()]
+    result = {'event_id': np.asarray([event_id for event_id, _ in batch], dtype=np.int64),
+              'counts': particles.batch_counts(batch)}
+    for name, values in zip(('px', 'py', 'pz', 'pdg'), columns):
+        result[name] = np.asarray(values, dtype=COLUMNS[name])
+    return result
+
+
+def iter_columns(path, batch_size=1000):
+    # Streams batch_columns-style dicts from a Set file or an event store, batch_size events at a time
+    if is_store(path):
+        store = load_store(path)
+        offsets = store['offsets']
+        for first in range(0, store['num_events'], batch_size):
+            last = min(first + batch_size, store['num_events'])
+            lo, hi = offsets[first], offsets[last]
+            yield {'event_id': store['event_id'][first:last], 'counts': np.diff(offsets[first:last + 1]),
+                   'px': store['px'][lo:hi], 'py': store['py'][lo:hi], 'pz': store['pz'][lo:hi],
+                   'pdg': store['pdg'][lo:hi]}
+        return
+    for batch in particles.read_event_blocks(path, batch_size=batch_size):
+        yield batch_columns(batch)
+
+
+def convert_set_file(txt_path, store_path=None, batch_size=1000):
+    if store_path is None:
+        store_path = store_path_for(txt_path)
+    os.makedirs(store_path, exist_ok=True)
+    meta_path = os.path.join(store_path, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    source_fingerprint = result_cache.file_fingerprint(txt_path)  # before reading, so later changes show
+
+    files = {name: open(os.path.join(store_path, name + ".bin"), "wb") for name in COLUMNS}
+    num_events = 0
+    num_particles = 0
+    try:
+        files['offsets'].write(np.zeros(1, dtype=np.int64).tobytes())
+        for columns in iter_columns(txt_path, batch_size):
+            offsets = num_particles + np.cumsum(columns['counts'])
+            num_particles += int(columns['counts'].sum())
+            num_events += len(columns['counts'])
+            offsets.astype(np.int64).tofile(files['offsets'])
+            for name in ('event_id', 'px', 'py', 'pz', 'pdg'):
+                columns[name].tofile(files[name])
+    finally:
+        for f in files.values():
+            f.close()
+
+    meta = {
+        'source': os.path.abspath(txt_path),
+        'source_fingerprint': source_fingerprint,
+        'num_events': num_events,
+        'num_particles': num_particles,
+        'columns': {name: np.dtype(dtype).str for name, dtype in COLUMNS.items()},
+    }
+    # meta.json is written last so a half-written store is never picked up by is_store
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    return store_path
+
+
+def load_store(store_path):
+    # Unreadable files raise OSError; a broken meta.json or a column shorter than it says, DamagedStoreError
+    try:
+        with open(os.path.join(store_path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        lengths = {
+            'event_id': meta['num_events'],
+            'offsets': meta['num_events'] + 1,
+        }
+        store = {'num_events': meta['num_events'], 'num_particles': meta['num_particles']}
+        for name, dtype in meta['columns'].items():
+            length = lengths.get(name, meta['num_particles'])
+            if length == 0:
+                store[name] = np.zeros(0, dtype=dtype)  # np.memmap refuses empty files
+            else:
+                store[name] = np.memmap(os.path.join(store_path, name + ".bin"), dtype=dtype, mode="r",
+                                        shape=(length,))
+    except (ValueError, KeyError, TypeError) as error:
+        raise DamagedStoreError(f"{store_path}: {type(error).__name__}: {error}") from error
+    return store
+
+
+if __name__ == "__main__":
+    # python Data_Science/event_store.py _Data/output-Set1.txt _Data/output-Set2.txt ...
+    for txt_path in sys.argv[1:]:
+        store_path = convert_set_file(txt_path)
+        print(f"[INFO] {txt_path} -> {store_path}")
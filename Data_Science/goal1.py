@@ -1,4 +1,7 @@
 import math
+import numpy as np
+
+import species
 
 def calculate_p(px, py, pz):    #This function calculates the momentum of a particle given its components.
     p = math.sqrt(px**2 + py**2 + pz**2)  #uses the formula for P
@@ -17,44 +20,69 @@ def calculate_azimuthal_angle(px, py):      #solve if you finish early
     return phi          
 
 def check_type (pdg_code):      #this function checks the type of particle based on the pdg code
-    if pdg_code == 211:
-        print("pion+")
-    elif pdg_code == -211:
-        print("pion-")
-    elif pdg_code == 111:
-        print("pion0")
+    name = species.species_name(pdg_code)  #looks the code up in the species table
+    if name.startswith("pion"):
+        print(name)
     else:
         print("not a pion")
 
+#       Array versions of the functions above: each argument can be a NumPy array
+#       (or anything np.asarray accepts) holding millions of particles at once.
+def calculate_p_array(px, py, pz):
+    px, py, pz = np.asarray(px, dtype=float), np.asarray(py, dtype=float), np.asarray(pz, dtype=float)
+    return np.sqrt(px**2 + py**2 + pz**2)
+
+def calculate_pT_array(px, py):
+    return np.hypot(np.asarray(px, dtype=float), np.asarray(py, dtype=float))
+
+def calculate_pseudorapidity_array(p, pz):
+    p, pz = np.asarray(p, dtype=float), np.asarray(pz, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        eta = 0.5 * np.log((p + pz) / (p - pz))
+    # p == |pz| means the particle flies along the beam: eta is +/- infinity, and 0 for p == 0
+    along_beam = (p == np.abs(pz))
+    eta = np.where(along_beam, np.copysign(np.inf, pz), eta)
+    return np.where(along_beam & (p == 0), 0.0, eta)
+
+def calculate_azimuthal_angle_array(px, py):
+    return np.arctan2(np.asarray(py, dtype=float), np.asarray(px, dtype=float))  #phi in (-pi, pi], also for px == 0
+
+def calculate_kinematics(px, py, pz):      #p, pT, eta and phi for whole arrays of particles in one call
+    p = calculate_p_array(px, py, pz)
+    pt = calculate_pT_array(px, py)
+    eta = calculate_pseudorapidity_array(p, pz)
+    phi = calculate_azimuthal_angle_array(px, py)
+    return p, pt, eta, phi
 
 
-#       Open the input file, read the first line to get event_id and num_particles,
-#       then read the rest of the lines into lines_list as lists of strings.
-try:
-    with open("_Data/output-Set0.txt", "r") as infile:  #open the file in read mode
-        first_line = infile.readline().strip()  #read the first line and remove any leading/trailing whitespace
-        event_id, num_particles = map(int, first_line.split())  #split the line into event_id and num_particles
-        lines_list = [line.strip().split() for line in infile]  #read the rest of the lines into a list of lists
+if __name__ == "__main__":
+    #       Open the input file, read the first line to get event_id and num_particles,
+    #       then read the rest of the lines into lines_list as lists of strings.
+    try:
+        with open("_Data/output-Set0.txt", "r") as infile:  #open the file in read mode
+            first_line = infile.readline().strip()  #read the first line and remove any leading/trailing whitespace
+            event_id, num_particles = map(int, first_line.split())  #split the line into event_id and num_particles
+            lines_list = [line.strip().split() for line in infile]  #read the rest of the lines into a list of lists
 
-except FileNotFoundError:
-    print("File not found. Please check the file path.")
-except IOError:
-    print("Error reading the file. Please check the file format.")
+    except FileNotFoundError:
+        print("File not found. Please check the file path.")
+    except IOError:
+        print("Error reading the file. Please check the file format.")
 
-print("event id is", event_id, "and there are", num_particles, "particles")       #print to show the events id and no of particles in the event
+    print("event id is", event_id, "and there are", num_particles, "particles")       #print to show the events id and no of particles in the event
 
 
-#       Loop through each particle in lines_list, convert values to float,
-#       call the analysis/calculation functions, and print the results as shown.
-for i in range(len(lines_list)):
-    print()
-    print ("Particle", i + 1)  #print the particle number
-    px, py, pz, pdg_code = map(float, lines_list[i])  #convert the values to float
-    p = calculate_p(px, py, pz)  #calculate the momentum
-    pt = calculate_pT(px, py)  #calculate the transverse momentum   
-    ps = calculate_pseudorapidity(p, pz)  #calculate the pseudorapidity
-    phi = calculate_azimuthal_angle(px, py)  #calculate the azimuthal angle 
-    particle_type = check_type(pdg_code)  #check the type of particle based on the pdg code
+    #       Loop through each particle in lines_list, convert values to float,
+    #       call the analysis/calculation functions, and print the results as shown.
+    for i in range(len(lines_list)):
+        print()
+        print ("Particle", i + 1)  #print the particle number
+        px, py, pz, pdg_code = map(float, lines_list[i])  #convert the values to float
+        p = calculate_p(px, py, pz)  #calculate the momentum
+        pt = calculate_pT(px, py)  #calculate the transverse momentum   
+        ps = calculate_pseudorapidity(p, pz)  #calculate the pseudorapidity
+        phi = calculate_azimuthal_angle(px, py)  #calculate the azimuthal angle 
+        particle_type = check_type(pdg_code)  #check the type of particle based on the pdg code
 
-    if particle_type is None:
-        print(f"Particle type:, {particle_type}, Momentum: {p:.10f}, Transverse Momentum: {pt:.10f}, Pseudorapidity: {ps:.10f}, Azimuthal Angle: {phi:.10f}")
+        if particle_type is None:
+            print(f"Particle type:, {particle_type}, Momentum: {p:.10f}, Transverse Momentum: {pt:.10f}, Pseudorapidity: {ps:.10f}, Azimuthal Angle: {phi:.10f}")
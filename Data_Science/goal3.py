@@ -1,136 +1,249 @@
-import math
+import argparse
+import json
+import multiprocessing
 import time
-import random
 import os
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
-# === Funcții de bază ===
-def calculate_average_and_uncertainty(total, count):
-    if count == 0:
-        return 0, 0
-    average = total / count
-    uncertainty = math.sqrt(total) / count
-    return average, uncertainty
-
-def check_type(pdg_code):
-    if pdg_code == 211:
-        return 1
-    elif pdg_code == -211:
-        return -1
-    return 0
-
-def read_events(filename, subsample_size=None, batch_size=1000):
-    try:
-        with open(filename, "r") as f:
-            batch = []
-            while True:
-                header = f.readline()
-                if not header:
-                    break
-                parts = header.strip().split()
-                if len(parts) != 2:
-                    continue
-                event_id = int(parts[0])
-                num_particles = int(parts[1])
-                particles = []
-                for _ in range(num_particles):
-                    line = f.readline()
-                    if not line:
-                        break
-                    particles.append(line.strip())
-
-                batch.append((event_id, particles))
-
-                if len(batch) == batch_size:
-                    yield batch
-                    batch = []
-
-            if batch:
-                yield batch
-
-    except FileNotFoundError:
-        print(f"[ERROR] File not found: {filename}")
-    except IOError:
-        print(f"[ERROR] Error reading file: {filename}")
-
-def process_file(args):
-    file_index, path = args
-    total_pos = 0
-    total_neg = 0
-    event_count = 0
-    batch_pos_list = []
-    batch_neg_list = []
-    results = []
-    for batch in read_events(path, batch_size=1000):
-        current_batch_pos = 0
-        current_batch_neg = 0
-        for event_id, particles in batch:
-            pos_count = 0
-            neg_count = 0
-            for p_line in particles:
-                parts = p_line.split()
-                if len(parts) < 4:
-                    continue
-                try:
-                    pdg_code = int(parts[3])
-                except ValueError:
-                    continue
-                type_flag = check_type(pdg_code)
-                if type_flag == 1:
-                    pos_count += 1
-                elif type_flag == -1:
-                    neg_count += 1
-            total_pos += pos_count
-            total_neg += neg_count
-            current_batch_pos += pos_count
-            current_batch_neg += neg_count
-            event_count += 1
-        batch_pos_list.append(current_batch_pos)
-        batch_neg_list.append(current_batch_neg)
-    avg_pos, unc_pos = calculate_average_and_uncertainty(total_pos, event_count)
-    avg_neg, unc_neg = calculate_average_and_uncertainty(total_neg, event_count)
-    mean_diff = avg_pos - avg_neg
-    combined_unc = math.sqrt(unc_pos**2 + unc_neg**2)
-    significance = mean_diff / combined_unc if combined_unc != 0 else 0
-    return {
-        'file_index': file_index,
-        'path': path,
-        'avg_pos': avg_pos,
-        'unc_pos': unc_pos,
-        'avg_neg': avg_neg,
-        'unc_neg': unc_neg,
-        'mean_diff': mean_diff,
-        'combined_unc': combined_unc,
-        'significance': significance
-    }
-
-# === Procesare fișiere ===
-file_paths = [f"_Data/output-Set{i}.txt" for i in range(1, 11)]
-
-start_time = time.time()
-
-with ProcessPoolExecutor() as executor:
-    futures = [executor.submit(process_file, (file_index, path)) for file_index, path in enumerate(file_paths, start=1)]
+import accumulators
+import chunking
+import cluster
+import event_store
+import pion_analysis
+import profiling
+import progress
+import result_cache
+import scheduler
+import set_io
+import set_records
+import shared_arrays
+import species
+
+# The per-file analysis lives in pion_analysis (workers) and particles (reading and
+# decoding); this script only plans the run, drives the pool and prints the results.
+
+if __name__ == "__main__":
+    # === Procesare fișiere ===
+    # Each Set file may also be stored compressed as .txt.gz / .txt.zst / .txt.xz
+    file_paths = [set_io.resolve_set_path(f"_Data/output-Set{i}.txt") for i in range(1, 11)]
+    # Use the converted event store while it matches its text file (see event_store.py)
+    file_paths = [event_store.choose_path(path) for path in file_paths]
+
+    parser = argparse.ArgumentParser(description="Pion asymmetry over all Set files")
+    parser.add_argument("--no-cache", action="store_true", help="reprocess every file and leave the result cache alone")
+    parser.add_argument("--hash", action="store_true", help="validate cached results by content hash instead of mtime")
+    parser.add_argument("--progress", action="store_true", help="show a live table of partial results while the pool runs")
+    parser.add_argument("--progress-every", type=int, default=10, help="batches between two progress updates of a worker")
+    parser.add_argument("--stop-at", type=float, help="stop early once |significance| over all files reaches this value")
+    parser.add_argument("--min-events", type=int, default=100000,
+                        help="events that must be processed before --stop-at may stop the run")
+    parser.add_argument("--decode-workers", type=int, default=0,
+                        help="threads per file for decoding block-gzipped (bgzip) Set files in parallel")
+    parser.add_argument("--read-ahead", type=int, default=0,
+                        help="raw blocks a reader thread may fetch ahead of parsing (0 = read inline)")
+    parser.add_argument("--shared-memory", action="store_true",
+                        help="parse in this process and hand workers shared-memory blocks instead of file paths "
+                             "(not with --progress, --stop-at or --coordinator)")
+    parser.add_argument("--species", default="",
+                        help="comma-separated species to count in the same pass, e.g. kaon+,kaon-,proton "
+                             f"(known: {', '.join(species.SPECIES)})")
+    parser.add_argument("--strict", action="store_true",
+                        help="fail a file at its first malformed record instead of skipping and counting them")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every worker's stages (read, pdg, count, ...) and write them to --profile-out")
+    parser.add_argument("--profile-out", default="_Data/goal3_profile.json", help="where --profile writes its report")
+    parser.add_argument("--cprofile", metavar="DIR",
+                        help="run every work unit under cProfile, dump the stats to DIR and merge them into DIR/goal3.prof")
+    parser.add_argument("--multiplicity", action="store_true",
+                        help="also print net-charge fluctuations from the joint (pi+, pi-) multiplicity distribution")
+    parser.add_argument("--workers", type=int,
+                        help="local pool size (default: the usable cores, fewer if memory is short)")
+    parser.add_argument("--coordinator", metavar="HOST:PORT",
+                        help="hand the work units to cluster workers (Data_Science/cluster.py) instead of a local pool")
+    parser.add_argument("--local-workers", type=int, default=0,
+                        help="with --coordinator: also start this many workers on this machine")
+    parser.add_argument("--chunks-per-file", type=int,
+                        help="with --coordinator: byte-range chunks per text file (default: planned as for the local pool)")
+    args = parser.parse_args()
+    species_names = tuple(name for name in args.species.split(",") if name)
+    unknown = [name for name in species_names if name not in species.SPECIES]
+    if unknown:
+        parser.error(f"unknown species: {', '.join(unknown)}")
+    # The shared-memory pipeline has no per-batch progress reports and runs only on this machine
+    if args.shared_memory:
+        clashing = [flag for flag, given in (("--progress", args.progress), ("--stop-at", args.stop_at is not None),
+                                             ("--coordinator", args.coordinator)) if given]
+        if clashing:
+            parser.error(f"--shared-memory cannot be combined with {', '.join(clashing)}")
+    # Reader and profiling options go to the workers with every work unit
+    settings = {'strict': args.strict, 'read_ahead': args.read_ahead, 'decode_workers': args.decode_workers,
+                'profile': args.profile, 'cprofile_dir': args.cprofile}
+    if args.cprofile:
+        os.makedirs(args.cprofile, exist_ok=True)
+        profiling.clear_cprofile(args.cprofile)
+
+    start_time = time.time()
+
+    # Unchanged files come straight from the result cache; only new or modified ones go to the pool
+    cache = {} if args.no_cache else result_cache.load_cache()
     results = []
-    for future in as_completed(futures):
-        result = future.result()
-        results.append(result)
-
-# Sort results by file_index to maintain order
-results.sort(key=lambda x: x['file_index'])
-
-for result in results:
-    print(f"\n[INFO] Processing file {result['file_index']}: {result['path']}")
-    print(f"[RESULT] File: {result['path']}")
-    print(f"  Average positive pions/event: {result['avg_pos']:.4f} ± {result['unc_pos']:.4f}")
-    print(f"  Average negative pions/event: {result['avg_neg']:.4f} ± {result['unc_neg']:.4f}")
-    print(f"  Mean difference: {result['mean_diff']:.4f}")
-    print(f"  Combined uncertainty: {result['combined_unc']:.4f}")
-    print(f"  Significance (σ): {result['significance']:.2f}")
-    if abs(result['significance']) >= 2:
-        print("  → Statistically significant difference.")
-    else:
-        print("  → No statistically significant difference.")
-
-end_time = time.time()
-print(f"\n[INFO] Total execution time: {end_time - start_time:.2f} seconds")
\ No newline at end of file
+    pending = []
+    for file_index, path in enumerate(file_paths, start=1):
+        cached = None if args.no_cache else result_cache.cached_result(cache, path, args.hash)
+        # Entries from before 'stats' existed, without the requested species or joint distribution,
+        # or with records skipped in lenient mode when --strict is asked for, are stale
+        if (cached is not None and cached.get('stats') is not None
+                and all(name in cached.get('species', {}) for name in species_names)
+                and not (args.multiplicity and 'joint' not in cached['stats'])
+                and not (args.strict and cached.get('read_report', {}).get('malformed'))):
+            results.append(dict(cached, file_index=file_index, path=path))
+        else:
+            pending.append((file_index, path))
+    if len(results):
+        print(f"[INFO] {len(results)} file(s) loaded from the result cache")
+
+    # Largest work first, text files cut into chunks of similar cost, on a pool sized to the
+    # cores and memory at hand (see scheduler.py)
+    # The shared-memory pipeline reads whole files in this process, so it needs no chunk boundaries
+    units = scheduler.plan_units(pending, species_names, args.workers, chunks=not args.shared_memory)
+    workers = args.workers or scheduler.pool_size(None if args.shared_memory else len(units), args.decode_workers)
+
+    monitor = None
+    pool_options = {}
+    if args.progress or args.stop_at is not None:
+        manager = multiprocessing.Manager()
+        progress_queue = manager.Queue()
+        stop_event = manager.Event()
+        pool_options = {'initializer': progress.init_worker,
+                        'initargs': (progress_queue, stop_event, args.progress_every)}
+        monitor = progress.ProgressMonitor(progress_queue, stop_event, args.stop_at, args.min_events)
+        # Files served from the cache count towards the live totals as well
+        for result in results:
+            monitor.partials[(result['file_index'], 0)] = (
+                result['path'], accumulators.PionAccumulator.from_dict(result['stats']), True)
+        monitor.start()
+
+    with ProcessPoolExecutor(max_workers=workers, **pool_options) as executor:
+        futures = {}
+        if args.shared_memory:
+            # One reader (this process) feeding many analyzers through shared memory
+            new_results = shared_arrays.run_pipeline(executor, pending, species_names=species_names,
+                                                     settings=settings)
+            units = []
+        elif args.coordinator:
+            # Work units go to cluster workers, which may run on other machines
+            if args.chunks_per_file:
+                units = cluster.build_units(pending, species_names, args.chunks_per_file)
+            new_results = cluster.run_coordinator(units, cluster.parse_address(args.coordinator), settings=settings,
+                                                  local_workers=args.local_workers)
+            units = []
+        for unit in units:
+            # Chunk results are merged per file below, whole-file results are final
+            futures[executor.submit(cluster.run_unit, unit, settings)] = (unit[1], unit[2]) if unit[0] == 'chunk' else None
+        if not args.shared_memory and not args.coordinator:
+            new_results = []
+        chunk_results = {}
+        for future in as_completed(futures):
+            if future.cancelled():
+                if futures[future] is not None:
+                    chunk_results.setdefault(futures[future], [])  # the file is merged as partial below
+                continue
+            if monitor is not None and monitor.stopped_early:
+                # Work that has not started yet is dropped; running workers stop after their current batch
+                for pending_future in futures:
+                    pending_future.cancel()
+            result = future.result()
+            if futures[future] is None:
+                new_results.append(result)
+            else:
+                chunk_results.setdefault(futures[future], []).append(result)
+        for (file_index, path), parts in chunk_results.items():
+            new_results.append(chunking.merge_chunks(file_index, path, parts, species_names=species_names))
+
+    if monitor is not None:
+        monitor.finish()
+        manager.shutdown()
+        if monitor.stopped_early:
+            print(f"[INFO] Stopped early: |significance| reached {args.stop_at} over all files")
+
+    # Timings belong to this run only, so they are taken off the results before caching
+    profiles = [profile for result in new_results for profile in result.pop('profile', [])]
+
+    # Partial results (stopped early, failed, read errors) are reported but never cached
+    complete = [result for result in new_results if not pion_analysis.is_partial(result)]
+    if not args.no_cache and complete:
+        for result in complete:
+            result_cache.store_result(cache, result['path'], result, args.hash)
+        result_cache.save_cache(cache)
+    results.extend(new_results)
+
+    # Sort results by file_index to maintain order
+    results.sort(key=lambda x: x['file_index'])
+
+    for result in results:
+        print(f"\n[INFO] Processing file {result['file_index']}: {result['path']}")
+        if 'read_report' in result:
+            for line in set_records.describe(set_records.ReadReport.from_dict(result['read_report']), result['path']):
+                print(line)
+        if result.get('failed'):
+            print(f"[RESULT] File: {result['path']} (failed, left out of the totals)")
+            continue
+        print(f"[RESULT] File: {result['path']}{' (partial, stopped early)' if result.get('stopped') else ''}")
+        print(f"  Average positive pions/event: {result['avg_pos']:.4f} ± {result['unc_pos']:.4f}")
+        print(f"  Average negative pions/event: {result['avg_neg']:.4f} ± {result['unc_neg']:.4f}")
+        print(f"  Mean difference: {result['mean_diff']:.4f}")
+        print(f"  Combined uncertainty: {result['combined_unc']:.4f}")
+        print(f"  Significance (σ): {result['significance']:.2f}")
+        event_count = result['stats']['pos']['n'] if result['stats'] else 0
+        for name in species_names:
+            average, uncertainty = accumulators.calculate_average_and_uncertainty(result['species'][name], event_count)
+            print(f"  Average {name}/event: {average:.4f} ± {uncertainty:.4f}")
+        if args.multiplicity and result['stats']:
+            for line in pion_analysis.fluctuation_lines(result['stats']):
+                print(line)
+        if abs(result['significance']) >= 2:
+            print("  → Statistically significant difference.")
+        else:
+            print("  → No statistically significant difference.")
+
+    # Per-file accumulators merge into the significance over all files without another pass
+    overall = accumulators.PionAccumulator.combine(
+        accumulators.PionAccumulator.from_dict(result['stats']) for result in results if result['stats'])
+    summary = overall.summary()
+    print(f"\n[RESULT] All files ({summary['events']} events)")
+    print(f"  Average positive pions/event: {summary['avg_pos']:.4f} ± {summary['unc_pos']:.4f}")
+    print(f"  Average negative pions/event: {summary['avg_neg']:.4f} ± {summary['unc_neg']:.4f}")
+    print(f"  Mean difference: {summary['mean_diff']:.4f}")
+    print(f"  Combined uncertainty: {summary['combined_unc']:.4f}")
+    print(f"  Significance (σ): {summary['significance']:.2f}")
+    for name in species_names:
+        total = sum(result['species'][name] for result in results if 'species' in result)
+        average, uncertainty = accumulators.calculate_average_and_uncertainty(total, summary['events'])
+        print(f"  Average {name}/event: {average:.4f} ± {uncertainty:.4f}")
+    if args.multiplicity:
+        for line in pion_analysis.fluctuation_lines(overall.to_dict()):
+            print(line)
+
+    end_time = time.time()
+    print(f"\n[INFO] Total execution time: {end_time - start_time:.2f} seconds")
+
+    if args.profile:
+        profile_summary = profiling.summarize(profiles)
+        print("\n[PROFILE] Worker time per stage (files served from the cache are not included)")
+        for line in profiling.render(profile_summary):
+            print(f"  {line}")
+        with open(args.profile_out, "w") as f:
+            json.dump({
+                'wall': end_time - start_time,
+                'summary': profile_summary,
+                'units': profiles,
+                'results': [{key: result[key] for key in ('file_index', 'path', 'avg_pos', 'avg_neg', 'significance')}
+                            for result in results],
+            }, f, indent=2)
+        print(f"[INFO] Profile written to {args.profile_out}")
+    if args.cprofile:
+        merged = os.path.join(args.cprofile, "goal3.prof")
+        stats = profiling.merge_cprofile(args.cprofile, merged)
+        if stats is not None:
+            print(f"\n[PROFILE] cProfile of all work units (top 15 by own time), merged into {merged}")
+            stats.sort_stats("tottime").print_stats(15)
@@ -0,0 +1,160 @@
+import argparse
+import math
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+import event_store
+import goal1
+import set_io
+import species
+
+# Fixed-bin histograms of p, pT, eta and phi filled in one streaming pass per
+# file. Only the bin counts are kept, never per-particle values, so workers can
+# run over files of any size and the parent just adds their histograms up.
+#
+#   python Data_Science/histograms.py --species pion+,pion- --output _Data/kinematics.npz --plot kinematics.png
+
+# name -> (bins, low, high)
+DEFAULT_SPECS = {
+    'p': (100, 0.0, 10.0),
+    'pT': (100, 0.0, 5.0),
+    'eta': (100, -5.0, 5.0),
+    'phi': (64, -math.pi, math.pi),
+}
+
+
+class Histogram1D:
+    # Uniform bins on [low, high), plus underflow, overflow and nan counters
+
+    def __init__(self, name, bins, low, high, counts=None):
+        self.name = name
+        self.bins = bins
+        self.low = low
+        self.high = high
+        # counts[0] underflow, counts[1:bins + 1] the bins, counts[bins + 1] overflow, counts[bins + 2] nan
+        self.counts = np.zeros(bins + 3, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    @property
+    def edges(self):
+        return np.linspace(self.low, self.high, self.bins + 1)
+
+    def fill(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        finite = ~np.isnan(values)
+        scaled = (values[finite] - self.low) * (self.bins / (self.high - self.low))
+        # floor() of +/-inf stays infinite, so clip before casting to an index
+        index = np.clip(np.floor(scaled), -1, self.bins).astype(np.int64) + 1
+        self.counts[:self.bins + 2] += np.bincount(index, minlength=self.bins + 2)
+        self.counts[self.bins + 2] += len(values) - int(finite.sum())
+        return self
+
+    def merge(self, other):
+        if (self.bins, self.low, self.high) != (other.bins, other.low, other.high):
+            raise ValueError(f"cannot merge histograms with different binning: {self.name}")
+        self.counts += other.counts
+        return self
+
+    def values(self):
+        return self.counts[1:self.bins + 1]
+
+    def to_dict(self):
+        return {'name': self.name, 'bins': self.bins, 'low': self.low, 'high': self.high, 'counts': self.counts}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['bins'], data['low'], data['high'], data['counts'])
+
+
+def make_histograms(specs=DEFAULT_SPECS):
+    return {name: Histogram1D(name, *spec) for name, spec in specs.items()}
+
+
+def fill_file_histograms(args):
+    # Worker: args = (path, specs, species_names); species_names empty means every particle
+    path, specs, species_names = args
+    histograms = make_histograms(specs)
+    wanted = [species.DEFAULT_TABLE.ids[name] for name in species_names]
+    for columns in event_store.iter_columns(path):
+        px, py, pz = columns['px'], columns['py'], columns['pz']
+        if wanted:
+            keep = np.isin(species.DEFAULT_TABLE.classify(columns['pdg']), wanted)
+            px, py, pz = px[keep], py[keep], pz[keep]
+        p, pt, eta, phi = goal1.calculate_kinematics(px, py, pz)
+        for name, values in (('p', p), ('pT', pt), ('eta', eta), ('phi', phi)):
+            if name in histograms:
+                histograms[name].fill(values)
+    return {name: histogram.to_dict() for name, histogram in histograms.items()}
+
+
+def fill_histograms(paths, specs=DEFAULT_SPECS, species_names=(), executor=None):
+    # One task per file; the results are summed bin by bin in the parent
+    total = make_histograms(specs)
+    tasks = [(path, specs, tuple(species_names)) for path in paths]
+    results = executor.map(fill_file_histograms, tasks) if executor is not None else map(fill_file_histograms, tasks)
+    for result in results:
+        for name, data in result.items():
+            total[name].merge(Histogram1D.from_dict(data))
+    return total
+
+
+def save_histograms(path, histograms):
+    # Compact .npz: per histogram one int64 counts array plus its binning
+    arrays = {}
+    for name, histogram in histograms.items():
+        arrays[f"{name}__counts"] = histogram.counts
+        arrays[f"{name}__binning"] = np.array([histogram.bins, histogram.low, histogram.high])
+    np.savez_compressed(path, **arrays)
+
+
+def load_histograms(path):
+    histograms = {}
+    with np.load(path) as data:
+        for key in data.files:
+            if key.endswith("__counts"):
+                name = key[:-len("__counts")]
+                bins, low, high = data[f"{name}__binning"]
+                histograms[name] = Histogram1D(name, int(bins), float(low), float(high), data[key])
+    return histograms
+
+
+def plot_histograms(histograms, output):
+    import matplotlib.pyplot as plt
+    fig, axes = plt.subplots(1, len(histograms), figsize=(4 * len(histograms), 3.5))
+    for ax, histogram in zip(np.atleast_1d(axes), histograms.values()):
+        ax.stairs(histogram.values(), histogram.edges)
+        ax.set_xlabel(histogram.name)
+        ax.set_ylabel("Particles")
+        ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kinematic histograms over Set files")
+    parser.add_argument("paths", nargs="*", help="Set files or event stores (default: _Data/output-Set1..10)")
+    parser.add_argument("--species", default="",
+                        help="comma-separated species to keep, e.g. pion+,pion- (default: all; "
+                             f"known: {', '.join(species.DEFAULT_TABLE.names)})")
+    parser.add_argument("--output", default="_Data/kinematics.npz", help="where to write the summed histograms")
+    parser.add_argument("--plot", help="also draw the histograms to this image file")
+    args = parser.parse_args()
+    species_names = tuple(name for name in args.species.split(",") if name)
+    unknown = [name for name in species_names if name not in species.DEFAULT_TABLE.ids]
+    if unknown:
+        parser.error(f"unknown species: {', '.join(unknown)}")
+
+    paths = args.paths
+    if not paths:
+        paths = []
+        for i in range(1, 11):
+            paths.append(event_store.choose_path(set_io.resolve_set_path(f"_Data/output-Set{i}.txt")))
+
+    with ProcessPoolExecutor() as executor:
+        histograms = fill_histograms(paths, DEFAULT_SPECS, species_names, executor)
+    save_histograms(args.output, histograms)
+    for name, histogram in histograms.items():
+        print(f"[INFO] {name}: {int(histogram.values().sum())} entries in range, "
+              f"{int(histogram.counts[0])} under, {int(histogram.counts[-2])} over, {int(histogram.counts[-1])} nan")
+    print(f"[INFO] Histograms written to {args.output}")
+    if args.plot:
+        plot_histograms(histograms, args.plot)
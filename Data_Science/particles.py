@@ -0,0 +1,171 @@
+import warnings
+
+import numpy as np
+
+import set_records
+import species
+
+# Set-file events as NumPy arrays: the batched reader, the pdg decoders (bulk and
+# per line) and the per-event pion counts. Shared by goal3 and every worker
+# module, so it must not import any of them.
+
+
+def check_type(pdg_code):
+    return species.pion_charge(pdg_code)  #1 for pion+, -1 for pion-, 0 for anything else
+
+
+def read_events(filename, subsample_size=None, batch_size=1000, read_ahead=None, strict=None, report=None,
+                decode_workers=None):
+    # Malformed records are skipped and counted in report (see set_records); strict=True raises instead
+    batch = []
+    for _, event_id, particles in set_records.read_records(filename, strict, report, read_ahead=read_ahead,
+                                                           decode_workers=decode_workers):
+        batch.append((event_id, particles))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_event_blocks(filename, batch_size=1000, read_ahead=None, strict=None, report=None, decode_workers=None):
+    # read_events with every event's particle lines left as the bytes block set_records read them in,
+    # so the bulk decoders below take them as they are; the other helpers accept both kinds of batch
+    batch = []
+    for _, event_id, block in set_records.read_records(filename, strict, report, read_ahead=read_ahead,
+                                                       decode_workers=decode_workers, raw=True):
+        batch.append((event_id, block))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def is_block_batch(batch):
+    return bool(batch) and isinstance(batch[0][1], bytes)
+
+
+def batch_bytes(batch):
+    # All particle lines of a batch as one bytes block, every line ending in a newline
+    if is_block_batch(batch):
+        return b"".join([block for _, block in batch])
+    return "".join([p_line + "\n" for _, particles in batch for p_line in particles]).encode()
+
+
+def batch_lines(batch):
+    # All particle lines of a batch as str, for the per-line rules
+    if is_block_batch(batch):
+        return batch_bytes(batch).decode(errors="replace").split("\n")[:-1]
+    return [p_line for _, particles in batch for p_line in particles]
+
+
+def batch_counts(batch):
+    # Particles per event
+    if is_block_batch(batch):
+        return np.fromiter((block.count(b"\n") for _, block in batch), dtype=np.int64, count=len(batch))
+    return np.fromiter((len(particles) for _, particles in batch), dtype=np.int64, count=len(batch))
+
+
+# === Kernel NumPy pe batch ===
+def pdg_code_of(p_line):
+    # Per-line rule of the original loop: short lines and non-integer codes are not pions
+    parts = p_line.split()
+    if len(parts) < 4:
+        return 0
+    try:
+        pdg_code = int(parts[3])
+    except ValueError:
+        return 0
+    return pdg_code if -2**63 <= pdg_code < 2**63 else 0  # codes beyond int64 are not pions either
+
+# Bytes the bulk decoder accepts in particle lines: number characters, single spaces, newlines
+BULK_BYTES = np.zeros(256, dtype=bool)
+BULK_BYTES[np.frombuffer(b"0123456789+-.eE \n", dtype=np.uint8)] = True
+PDG_DIGITS = 18  # longest pdg field decoded in bulk; any 18-digit code fits int64
+
+
+def particle_layout(data):
+    # Where each line's pdg field starts and ends in data, particle lines that each end in a newline.
+    # None unless every line is plain "px py pz pdg": the per-line rules apply to anything else.
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not BULK_BYTES[raw].all() or (len(raw) and raw[-1] != ord("\n")):
+        return None
+    newlines = np.flatnonzero(raw == ord("\n"))
+    spaces = np.flatnonzero(raw == ord(" "))
+    if len(spaces) != 3 * len(newlines):
+        return None
+    spaces = spaces.reshape(-1, 3)
+    starts = np.concatenate(([0], newlines[:-1] + 1))[:len(newlines)]
+    # Three spaces inside every line, none of the four fields empty
+    if (np.any(spaces[:, 0] <= starts) or np.any(np.diff(spaces, axis=1) < 2)
+            or np.any(spaces[:, 2] >= newlines - 1)):
+        return None
+    return raw, spaces[:, 2] + 1, newlines
+
+
+def decode_pdg(raw, first, ends):
+    # int() of every field raw[first:end] at once: an optional sign, then digits. None if a field is anything else.
+    if len(first) == 0:
+        return np.zeros(0, dtype=np.int64)
+    sign = raw[first]
+    digits_from = first + ((sign == ord("+")) | (sign == ord("-")))
+    widths = ends - digits_from
+    if widths.min() < 1 or widths.max() > PDG_DIGITS:
+        return None
+    # Fields right-aligned in a (lines, width) window of digit values
+    width = int(widths.max())
+    positions = ends[:, None] - width + np.arange(width)
+    in_field = positions >= digits_from[:, None]
+    digits = raw[np.maximum(positions, 0)].astype(np.int64) - ord("0")
+    if np.any(in_field & ((digits < 0) | (digits > 9))):
+        return None
+    values = np.where(in_field, digits, 0) @ 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    return np.where(sign == ord("-"), -values, values)
+
+
+def decode_particles(batch):
+    # Bulk decode of a batch's particle lines: (momenta, pdg) with momenta an (n, 3) float64 array of
+    # px, py, pz parsed by one np.fromstring call. None when the per-line rules have to be used instead.
+    data = batch_bytes(batch)
+    layout = particle_layout(data)
+    if layout is None:
+        return None
+    raw, pdg_first, ends = layout
+    pdg = decode_pdg(raw, pdg_first, ends)
+    if pdg is None:
+        return None
+    if len(pdg) == 0:
+        return np.zeros((0, 3)), pdg
+    # Text fromstring cannot parse is a DeprecationWarning rather than a ValueError (an error under -W error)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            values = np.fromstring(data, sep=" ")
+        except (ValueError, DeprecationWarning):
+            return None
+    if len(values) != 4 * len(pdg):
+        return None
+    return values.reshape(-1, 4)[:, :3], pdg
+
+
+def batch_pdg_array(batch):
+    # Decodes the pdg column of a whole batch into one array.
+    # Returns (pdg, counts): pdg has one entry per particle line, counts one per event.
+    counts = batch_counts(batch)
+    layout = particle_layout(batch_bytes(batch))
+    if layout is not None:
+        raw, pdg_first, ends = layout
+        pdg = decode_pdg(raw, pdg_first, ends)
+        if pdg is not None:
+            return pdg, counts
+    pdg = np.fromiter((pdg_code_of(p_line) for p_line in batch_lines(batch)), dtype=np.int64, count=int(counts.sum()))
+    return pdg, counts
+
+
+def count_pions(pdg, counts):
+    # Per-event (pos, neg) pion counts; events with no particles get zeros
+    event_of = np.repeat(np.arange(len(counts)), counts)
+    event_pos = np.bincount(event_of[pdg == 211], minlength=len(counts))
+    event_neg = np.bincount(event_of[pdg == -211], minlength=len(counts))
+    return event_pos, event_neg
@@ -0,0 +1,182 @@
+import math
+import os
+import numpy as np
+
+import accumulators
+import event_store
+import particles
+import profiling
+import progress
+import set_io
+import set_records
+import species
+
+# goal3's per-file work: result dicts and the whole-file workers (text files and
+# event stores). chunking and shared_arrays build the same result dicts, and the
+# goal3 script, the cluster workers and the service all run these workers.
+
+
+def build_result(file_index, path, total_pos, total_neg, event_count, batch_pos_list, batch_neg_list, stats=None):
+    avg_pos, unc_pos = accumulators.calculate_average_and_uncertainty(total_pos, event_count)
+    avg_neg, unc_neg = accumulators.calculate_average_and_uncertainty(total_neg, event_count)
+    mean_diff = avg_pos - avg_neg
+    combined_unc = math.sqrt(unc_pos**2 + unc_neg**2)
+    significance = mean_diff / combined_unc if combined_unc != 0 else 0
+    return {
+        'file_index': file_index,
+        'path': path,
+        'avg_pos': avg_pos,
+        'unc_pos': unc_pos,
+        'avg_neg': avg_neg,
+        'unc_neg': unc_neg,
+        'mean_diff': mean_diff,
+        'combined_unc': combined_unc,
+        'significance': significance,
+        'batch_pos': batch_pos_list,
+        'batch_neg': batch_neg_list,
+        'stats': stats
+    }
+
+
+def finish_result(result, stopped, species_totals=None, report=None):
+    # A run cut short by the progress monitor only covers part of the file
+    if stopped:
+        result['stopped'] = True
+    if species_totals:
+        result['species'] = species_totals
+    if report:
+        result['read_report'] = report.to_dict()
+    return result
+
+
+def failed_result(file_index, path, error, species_names=(), report=None):
+    # Returned instead of raising, so one unreadable file never takes down a pool worker or the run
+    if report is None:
+        report = set_records.ReadReport()
+    if error is not None:  # None when the report already says why
+        report.error(f"{type(error).__name__}: {error}")
+    result = build_result(file_index, path, 0, 0, 0, [], [], accumulators.PionAccumulator().to_dict())
+    result['failed'] = True
+    return finish_result(result, False, dict.fromkeys(species_names, 0), report)
+
+
+def fluctuation_lines(stats):
+    # Event-by-event charge correlations, read off the joint multiplicity distribution in stats
+    joint = accumulators.PionAccumulator.from_dict(stats).joint.summary()
+    return [f"  Net charge (pi+ - pi-)/event: {joint['mean_net']:.4f}, variance {joint['var_net']:.4f} "
+            f"(scaled by <pi+ + pi->: {joint['var_net_scaled']:.4f})",
+            f"  Covariance(pi+, pi-): {joint['covariance']:.4f} (correlation {joint['correlation']:.4f})"]
+
+
+def is_partial(result):
+    # Stopped early, failed or cut short by a read error: shown, but never cached
+    return bool(result.get('stopped') or result.get('failed') or result.get('read_report', {}).get('errors'))
+
+
+def add_species_totals(species_totals, pdg):
+    # Counts every requested species in the same pass as the pions
+    if species_totals:
+        for name, count in species.DEFAULT_TABLE.totals(pdg, species_totals).items():
+            species_totals[name] += count
+
+
+def process_store(file_index, path, batch_size=1000, species_names=(), settings=None):
+    # Same counting as process_file, but over the memory-mapped columns of an event store
+    store = event_store.load_store(path)
+    offsets = store['offsets']
+    pdg = store['pdg']
+    total_pos = 0
+    total_neg = 0
+    event_count = 0
+    batch_pos_list = []
+    batch_neg_list = []
+    stats = accumulators.PionAccumulator()
+    stopped = False
+    species_totals = dict.fromkeys(species_names, 0)
+    profile = profiling.start(path, (settings or {}).get('profile'))
+    for first in range(0, store['num_events'], batch_size):
+        profile.lap()
+        last = min(first + batch_size, store['num_events'])
+        batch_pdg = pdg[offsets[first]:offsets[last]]
+        counts = np.diff(offsets[first:last + 1])
+        profile.lap('read')
+        event_pos, event_neg = particles.count_pions(batch_pdg, counts)
+        profile.lap('count')
+        add_species_totals(species_totals, batch_pdg)
+        profile.lap('species')
+        stats.add_events(event_pos, event_neg)
+        current_batch_pos = int(event_pos.sum())
+        current_batch_neg = int(event_neg.sum())
+        total_pos += current_batch_pos
+        total_neg += current_batch_neg
+        event_count += last - first
+        batch_pos_list.append(current_batch_pos)
+        batch_neg_list.append(current_batch_neg)
+        profile.lap('stats')
+        if progress.report((file_index, 0), path, stats):
+            stopped = True
+            break
+        profile.lap('progress')
+    progress.report((file_index, 0), path, stats, final=True)
+    profile.finish(event_count, (event_count + 1) * offsets.itemsize + int(offsets[event_count]) * pdg.itemsize)
+    return profiling.attach(finish_result(build_result(file_index, path, total_pos, total_neg, event_count,
+                                                       batch_pos_list, batch_neg_list, stats.to_dict()),
+                                          stopped, species_totals), profile)
+
+
+@profiling.cprofiled
+def process_file(args, settings=None):
+    # args: (file_index, path), plus optionally species_names to also count other species and a batch size.
+    # settings: the run's reader and profiling options (see cluster.run_unit); missing ones use the defaults
+    file_index, path = args[:2]
+    species_names = args[2] if len(args) > 2 else ()
+    batch_size = args[3] if len(args) > 3 else 1000
+    report = set_records.ReadReport()
+    try:
+        if event_store.is_store(path):
+            return process_store(file_index, path, batch_size, species_names, settings)
+        return process_text(file_index, path, species_names, report, batch_size, settings)
+    except (set_records.MalformedRecordError, event_store.DamagedStoreError) + set_io.READ_ERRORS as error:
+        return failed_result(file_index, path, error, species_names, report)
+
+
+def process_text(file_index, path, species_names=(), report=None, batch_size=1000, settings=None):
+    settings = settings or {}
+    total_pos = 0
+    total_neg = 0
+    event_count = 0
+    batch_pos_list = []
+    batch_neg_list = []
+    stats = accumulators.PionAccumulator()
+    stopped = False
+    species_totals = dict.fromkeys(species_names, 0)
+    # Stages: read = I/O and splitting records, pdg = laying out the particle lines and parsing the codes
+    profile = profiling.start(path, settings.get('profile'))
+    batches = particles.read_event_blocks(path, batch_size=batch_size, read_ahead=settings.get('read_ahead'),
+                                          strict=settings.get('strict'), report=report,
+                                          decode_workers=settings.get('decode_workers'))
+    for batch in profile.iterate('read', batches):
+        batch_pdg, counts = particles.batch_pdg_array(batch)
+        profile.lap('pdg')
+        event_pos, event_neg = particles.count_pions(batch_pdg, counts)
+        profile.lap('count')
+        add_species_totals(species_totals, batch_pdg)
+        profile.lap('species')
+        stats.add_events(event_pos, event_neg)
+        current_batch_pos = int(event_pos.sum())
+        current_batch_neg = int(event_neg.sum())
+        total_pos += current_batch_pos
+        total_neg += current_batch_neg
+        event_count += len(batch)
+        batch_pos_list.append(current_batch_pos)
+        batch_neg_list.append(current_batch_neg)
+        profile.lap('stats')
+        if progress.report((file_index, 0), path, stats):
+            stopped = True
+            break
+        profile.lap('progress')
+    progress.report((file_index, 0), path, stats, final=True)
+    profile.finish(event_count, os.path.getsize(path) if os.path.isfile(path) else 0)
+    return profiling.attach(finish_result(build_result(file_index, path, total_pos, total_neg, event_count,
+                                                       batch_pos_list, batch_neg_list, stats.to_dict()),
+                                          stopped, species_totals, report), profile)
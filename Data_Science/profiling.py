@@ -0,0 +1,171 @@
+import cProfile
+import functools
+import glob
+import itertools
+import os
+import pstats
+import time
+
+# Optional instrumentation of the goal3 workers. With profiling on, every work
+# unit (a file, a chunk or a shared-memory segment) times its stages per batch
+# and returns them with its result; the parent adds them up at the end. With it
+# off, start() hands out one shared do-nothing profile, so the hot loop pays a
+# couple of empty method calls per 1000-event batch.
+#
+# cProfile mode dumps one .prof per work unit into a directory, merged by the
+# parent into one file for `python -m pstats` or snakeviz. For py-spy, run
+#   py-spy record --subprocesses -o goal3.svg -- python Data_Science/goal3.py --no-cache
+# the stages below are separate functions, so they show up as such in the flame graph.
+
+# Defaults for code that is not handed a unit's settings; goal3 passes --profile / --cprofile
+# to its workers with every work unit (see cluster.run_unit), so they never rely on these
+enabled = False
+cprofile_dir = None
+
+_dump_numbers = itertools.count()
+
+
+class StageProfile:
+    # Cumulative seconds per stage, measured lap by lap
+
+    def __init__(self, label):
+        self.label = label
+        self.pid = os.getpid()
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.events = 0
+        self.bytes_read = 0
+        self.wall = 0.0
+
+    def lap(self, stage=None):
+        # Charges the time since the previous lap to stage (None just restarts the clock)
+        now = time.perf_counter()
+        if stage is not None:
+            self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def iterate(self, stage, iterable):
+        # Charges the time spent inside next() to stage, e.g. reading and splitting records
+        iterator = iter(iterable)
+        while True:
+            self.last = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.lap(stage)
+            yield item
+
+    def finish(self, events, bytes_read):
+        self.events = events
+        self.bytes_read = bytes_read
+        self.wall = time.perf_counter() - self.started
+
+    def to_dict(self):
+        return {
+            'label': self.label,
+            'pid': self.pid,
+            'wall': self.wall,
+            'stages': dict(self.stages),
+            'events': self.events,
+            'bytes_read': self.bytes_read,
+            'events_per_sec': self.events / self.wall if self.wall > 0 else 0.0,
+        }
+
+
+class NullProfile:
+    # Stands in for StageProfile when profiling is off
+
+    def lap(self, stage=None):
+        pass
+
+    def iterate(self, stage, iterable):
+        return iterable
+
+    def finish(self, events, bytes_read):
+        pass
+
+
+NULL = NullProfile()
+
+
+def start(label, profile=None):
+    # profile: the unit's 'profile' setting; None falls back to the module default
+    if profile is None:
+        profile = enabled
+    return StageProfile(label) if profile else NULL
+
+
+def attach(result, profile):
+    # Results carry a list of unit profiles, so chunk and segment results can simply be concatenated
+    if profile is not NULL:
+        result['profile'] = [profile.to_dict()]
+    return result
+
+
+def cprofiled(function):
+    # Worker entry points: with a cprofile_dir in the settings= keyword (or the module default),
+    # each call runs under cProfile and dumps its stats there
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        directory = (kwargs.get('settings') or {}).get('cprofile_dir', cprofile_dir)
+        if directory is None:
+            return function(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(function, *args, **kwargs)
+        finally:
+            os.makedirs(directory, exist_ok=True)  # a cluster worker may not have it yet
+            profiler.dump_stats(os.path.join(directory,
+                                             f"{function.__name__}-{os.getpid()}-{next(_dump_numbers)}.prof"))
+    return wrapper
+
+
+def unit_dumps(directory):
+    return sorted(path for name in ("process_file", "process_chunk", "analyze_segment")
+                  for path in glob.glob(os.path.join(directory, f"{name}-*.prof")))
+
+
+def clear_cprofile(directory):
+    # Dumps of an earlier run would otherwise be merged into this one
+    for path in unit_dumps(directory):
+        os.remove(path)
+
+
+def merge_cprofile(directory, output):
+    # One pstats file out of every per-unit dump; returns it loaded, or None without dumps
+    paths = unit_dumps(directory)
+    if not paths:
+        return None
+    pstats.Stats(*paths).dump_stats(output)
+    return pstats.Stats(output)
+
+
+def summarize(profiles):
+    # Totals per stage and per worker process over a list of unit profiles
+    stages = {}
+    workers = {}
+    for profile in profiles:
+        for stage, seconds in profile['stages'].items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+        worker = workers.setdefault(profile['pid'], {'units': 0, 'wall': 0.0, 'events': 0, 'bytes_read': 0})
+        worker['units'] += 1
+        worker['wall'] += profile['wall']
+        worker['events'] += profile['events']
+        worker['bytes_read'] += profile['bytes_read']
+    for worker in workers.values():
+        worker['events_per_sec'] = worker['events'] / worker['wall'] if worker['wall'] > 0 else 0.0
+    return {'stages': stages, 'workers': {str(pid): worker for pid, worker in sorted(workers.items())}}
+
+
+def render(summary):
+    lines = [f"{'stage':<12} {'seconds':>10} {'share':>7}"]
+    total = sum(summary['stages'].values())
+    for stage, seconds in sorted(summary['stages'].items(), key=lambda item: -item[1]):
+        lines.append(f"{stage:<12} {seconds:>10.3f} {100 * seconds / total if total else 0:>6.1f}%")
+    lines.append(f"{'worker pid':<12} {'units':>6} {'events':>10} {'MB read':>9} {'events/s':>11}")
+    for pid, worker in summary['workers'].items():
+        lines.append(f"{pid:<12} {worker['units']:>6} {worker['events']:>10} {worker['bytes_read'] / 1e6:>9.1f} "
+                     f"{worker['events_per_sec']:>11.0f}")
+    return lines
@@ -0,0 +1,112 @@
+import queue as queue_module
+import sys
+import threading
+import time
+
+import accumulators
+
+# Live progress for the goal3 process pool. Workers push their running
+# PionAccumulator every few batches onto a shared queue; a thread in the parent
+# keeps the latest one per work unit, prints a table and can raise a stop flag
+# once the overall significance is past a threshold.
+
+# Set in each worker by init_worker; None means progress reporting is off
+_queue = None
+_stop_event = None
+_every = 10
+_batches_seen = {}
+
+
+def init_worker(progress_queue, stop_event, every=10):
+    # ProcessPoolExecutor initializer
+    global _queue, _stop_event, _every
+    _queue = progress_queue
+    _stop_event = stop_event
+    _every = every
+    _batches_seen.clear()
+
+
+def report(key, label, stats, final=False):
+    # Called by workers after every batch. Returns True when the parent asked to stop.
+    if _queue is None:
+        return False
+    seen = _batches_seen.get(key, 0) + 1
+    _batches_seen[key] = seen
+    if final or seen % _every == 0:
+        _queue.put((key, label, stats.to_dict(), final))
+        return _stop_event.is_set()
+    return False
+
+
+class ProgressMonitor(threading.Thread):
+
+    def __init__(self, progress_queue, stop_event, stop_at=None, min_events=0, interval=1.0, stream=sys.stderr):
+        super().__init__(daemon=True)
+        self.queue = progress_queue
+        self.stop_event = stop_event
+        self.stop_at = stop_at
+        self.min_events = min_events
+        self.interval = interval
+        self.stream = stream
+        self.partials = {}
+        self.stopped_early = False
+        self._done = threading.Event()
+        self._lines_drawn = 0
+
+    def overall(self):
+        return accumulators.PionAccumulator.combine(stats for _, stats, _ in self.partials.values())
+
+    def run(self):
+        last_render = 0.0
+        while not self._done.is_set():
+            try:
+                key, label, stats, final = self.queue.get(timeout=0.2)
+            except queue_module.Empty:
+                continue
+            except (EOFError, OSError):
+                break  # the manager went away with the pool
+            self.partials[key] = (label, accumulators.PionAccumulator.from_dict(stats), final)
+            self.check_threshold()
+            if time.time() - last_render >= self.interval:
+                self.render()
+                last_render = time.time()
+
+    def check_threshold(self):
+        # "Confidently crossed": past the threshold with at least min_events behind it
+        if self.stop_at is None or self.stop_event.is_set():
+            return
+        summary = self.overall().summary()
+        if summary['events'] >= self.min_events and abs(summary['significance']) >= self.stop_at:
+            self.stopped_early = True
+            self.stop_event.set()
+
+    def render(self):
+        # On a terminal the table is redrawn in place, otherwise it is appended
+        lines = [f"{'unit':<40} {'events':>10} {'pi+/ev':>8} {'pi-/ev':>8} {'sigma':>7}"]
+        for key in sorted(self.partials):
+            label, stats, final = self.partials[key]
+            summary = stats.summary()
+            name = label if key[1] == 0 else f"{label} @{key[1]}"
+            lines.append(f"{name[-40:]:<40} {summary['events']:>10} {summary['avg_pos']:>8.4f} "
+                         f"{summary['avg_neg']:>8.4f} {summary['significance']:>7.2f}{'' if final else ' …'}")
+        summary = self.overall().summary()
+        lines.append(f"{'all':<40} {summary['events']:>10} {summary['avg_pos']:>8.4f} "
+                     f"{summary['avg_neg']:>8.4f} {summary['significance']:>7.2f}")
+        if self.stream.isatty() and self._lines_drawn:
+            self.stream.write(f"\x1b[{self._lines_drawn}F\x1b[J")
+        self.stream.write("\n".join(lines) + "\n")
+        self.stream.flush()
+        self._lines_drawn = len(lines)
+
+    def finish(self):
+        # Drains what is left on the queue and draws the final table
+        self._done.set()
+        self.join()
+        while True:
+            try:
+                key, label, stats, final = self.queue.get_nowait()
+            except (queue_module.Empty, EOFError, OSError):
+                break
+            self.partials[key] = (label, accumulators.PionAccumulator.from_dict(stats), final)
+        if self.partials:
+            self.render()
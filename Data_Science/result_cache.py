@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+
+# On-disk cache of process_file results, keyed by the file's absolute path and
+# validated by a fingerprint (size + mtime, or a content hash if asked for).
+CACHE_PATH = "_Data/.goal3_cache.json"
+
+
+def file_fingerprint(path, content_hash=False):
+    if os.path.isdir(path):
+        # Event stores are rewritten through meta.json, which is written last
+        path = os.path.join(path, "meta.json")
+    stat = os.stat(path)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if content_hash:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+
+def load_cache(cache_path=CACHE_PATH):
+    try:
+        with open(cache_path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (IOError, ValueError):
+        print(f"[WARN] Ignoring unreadable result cache: {cache_path}")
+        return {}
+
+
+def save_cache(cache, cache_path=CACHE_PATH):
+    # Write to a temporary file first so an interrupted run never leaves half a cache
+    directory = os.path.dirname(cache_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, cache_path)
+
+
+def cached_result(cache, path, content_hash=False):
+    entry = cache.get(os.path.abspath(path))
+    if entry is None:
+        return None
+    expected = entry['fingerprint']
+    # A content hash survives a touch or a copy that only changes the mtime
+    use_hash = content_hash and 'sha256' in expected
+    try:
+        fingerprint = file_fingerprint(path, use_hash)
+    except OSError:
+        return None
+    keys = ('size', 'sha256') if use_hash else ('size', 'mtime_ns')
+    if any(fingerprint[key] != expected.get(key) for key in keys):
+        return None
+    return entry['result']
+
+
+def store_result(cache, path, result, content_hash=False):
+    try:
+        fingerprint = file_fingerprint(path, content_hash)
+    except OSError:
+        return  # missing files are reported by read_events and never cached
+    cache[os.path.abspath(path)] = {'fingerprint': fingerprint, 'result': result}
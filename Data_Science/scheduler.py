@@ -0,0 +1,87 @@
+import math
+import os
+
+import chunking
+import event_store
+import set_io
+
+# Plans the goal3 local pool: how many workers, and which work units in which
+# order. Every file gets a cost estimate; text files are cut into chunks of
+# about the same cost, so a large file never leaves the other cores idle at
+# the end, and all units go to the pool largest first. The pool hands each
+# free worker the next unit from its queue, so fast workers simply take more
+# of them (the chunks are what they steal).
+
+# Rough processing cost per byte on disk, relative to plain text (measured with process_file on the Set files)
+COST_PER_BYTE = {'.gz': 3.5, '.zst': 2.7, '.xz': 9.6, 'store': 0.06, 'text': 1.0}
+UNITS_PER_WORKER = 4  # enough pieces that the last ones are small next to a whole file
+MIN_CHUNK_BYTES = 4 << 20  # below this, splitting costs more than it saves
+WORKER_MEMORY = 256 << 20  # resident size of one pool worker with its batches
+
+
+def file_cost(path):
+    if event_store.is_store(path):
+        size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+        return size * COST_PER_BYTE['store']
+    if not os.path.isfile(path):
+        return 0.0  # missing: fails at once in the worker
+    size = os.path.getsize(path)
+    for suffix in set_io.COMPRESSED_SUFFIXES:
+        if path.endswith(suffix):
+            return size * COST_PER_BYTE[suffix]
+    return size * COST_PER_BYTE['text']
+
+
+def usable_cores():
+    # Cores this process may run on (a taskset or container limit can be below os.cpu_count())
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def available_memory():
+    # Bytes the system can hand out without swapping, or None when unknown
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def pool_size(num_units=None, decode_workers=0):
+    # Workers for the local pool: no more than the cores, the memory or the work (if known) allows
+    # Parallel decoding gives every worker its own decode threads, which need cores and memory too
+    workers = max(1, usable_cores() // max(1, decode_workers))
+    memory = available_memory()
+    if memory is not None:
+        workers = min(workers, max(1, memory // (WORKER_MEMORY * (1 + decode_workers))))
+    if num_units is not None:
+        workers = min(workers, num_units)
+    return max(1, workers)
+
+
+def plan_units(jobs, species_names=(), workers=None, chunks=True):
+    # jobs: (file_index, path) pairs -> work units in the cluster.build_units format, most expensive first.
+    # chunks=False keeps every file whole (and skips find_chunks) for runs that never use chunks.
+    if workers is None:
+        workers = usable_cores()
+    costs = {path: file_cost(path) for _, path in jobs}
+    target = max(sum(costs.values()) / (workers * UNITS_PER_WORKER), MIN_CHUNK_BYTES)
+    planned = []
+    for file_index, path in jobs:
+        # Byte-range chunks only make sense in uncompressed text
+        if chunks and os.path.isfile(path) and not set_io.is_compressed(path) and costs[path] > target:
+            num_chunks = math.ceil(costs[path] / target)
+            for start, end in chunking.find_chunks(path, num_chunks):
+                planned.append(((end - start) * COST_PER_BYTE['text'],
+                                ('chunk', file_index, path, start, end, species_names)))
+        else:
+            planned.append((costs[path], ('file', file_index, path, species_names)))
+    planned.sort(key=lambda item: -item[0])
+    return [unit for _, unit in planned]
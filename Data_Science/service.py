@@ -0,0 +1,230 @@
+import argparse
+import mmap
+import multiprocessing
+import os
+import secrets
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.connection import Client, Listener
+
+import chunking
+import cluster
+import event_store
+import pion_analysis
+import result_cache
+import scheduler
+import service_client
+import set_io
+import species
+
+# Long-lived goal3 analysis daemon. It keeps a process pool warm (interpreter,
+# NumPy and the analysis modules already loaded), listens on a Unix socket and
+# answers analysis jobs with the same result dicts goal3 produces. Results are
+# remembered per (file, species, batch size) until the file changes, so a repeated
+# question is answered without touching the pool. With --mmap, requested text
+# files stay mapped and are read ahead into the page cache.
+#
+#   python Data_Science/service.py --workers 8 --mmap &
+#   python Data_Science/service_client.py _Data/output-Set1.txt _Data/output-Set2.txt
+#
+# Jobs are dicts: {'command': 'analyze', 'paths': [...], 'species': [...], 'batch_size': 1000,
+# 'fresh': False}, or {'command': 'ping'} / {'command': 'shutdown'}.
+MAX_REMEMBERED = 4096  # results kept; the least recently used go first
+MAX_MAPPED = 64  # text files kept mapped; the least recently requested are unmapped
+
+
+def ping(_):
+    return os.getpid()
+
+
+def service_authkey(address):
+    # GOAL3_AUTHKEY if set; otherwise a random key in a file only this user can read, for service_client
+    key = os.environ.get("GOAL3_AUTHKEY")
+    if key:
+        return key.encode()
+    key = secrets.token_hex(16).encode()
+    path = service_client.key_path(address)
+    if os.path.exists(path):
+        os.remove(path)  # left behind by a service that did not shut down cleanly
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as f:
+        f.write(key)
+    return key
+
+
+class AnalysisService:
+
+    def __init__(self, workers, use_mmap=False, max_remembered=MAX_REMEMBERED, max_mapped=MAX_MAPPED):
+        self.workers = workers
+        self.use_mmap = use_mmap
+        self.max_remembered = max_remembered
+        self.max_mapped = max_mapped
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.memo = OrderedDict()  # (path, species, batch_size) -> (fingerprint, result), oldest use first
+        self.mapped = OrderedDict()  # path -> (fingerprint, mmap), oldest request first
+        self.lock = threading.Lock()
+        self.jobs = 0
+        self.started = time.time()
+        # Start every worker now rather than on the first job
+        self.pids = sorted(set(self.executor.map(ping, range(workers))))
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+        for _, mapping in self.mapped.values():
+            mapping.close()
+
+    def fingerprint(self, path):
+        try:
+            return result_cache.file_fingerprint(path)
+        except OSError:
+            return None
+
+    def keep_mapped(self, path, fingerprint):
+        # Maps a text file once per version and asks the kernel to read it ahead
+        if (not self.use_mmap or fingerprint is None or not os.path.isfile(path)
+                or set_io.is_compressed(path) or fingerprint['size'] == 0):
+            return
+        with self.lock:
+            known = self.mapped.get(path)
+            if known is not None and known[0] == fingerprint:
+                self.mapped.move_to_end(path)
+                return
+            if known is not None:
+                known[1].close()
+            with open(path, "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mapping, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+                mapping.madvise(mmap.MADV_WILLNEED)
+            self.mapped[path] = (fingerprint, mapping)
+            self.mapped.move_to_end(path)
+            while len(self.mapped) > self.max_mapped:
+                _, (_, oldest) = self.mapped.popitem(last=False)
+                oldest.close()
+
+    def remember(self, key, fingerprint, result):
+        with self.lock:
+            self.memo[key] = (fingerprint, result)
+            self.memo.move_to_end(key)
+            while len(self.memo) > self.max_remembered:
+                self.memo.popitem(last=False)
+
+    def analyze(self, paths, species_names=(), batch_size=1000, fresh=False):
+        species_names = tuple(species_names)
+        results = {}
+        pending = []
+        fingerprints = {}
+        remembered = 0
+        for file_index, path in enumerate(paths, start=1):
+            path = set_io.resolve_set_path(path)
+            if not event_store.is_store(path):
+                path = event_store.choose_path(path)
+            key = (os.path.abspath(path), species_names, batch_size)
+            fingerprints[key] = self.fingerprint(path)
+            self.keep_mapped(path, fingerprints[key])
+            with self.lock:
+                known = self.memo.get(key)
+                if known is not None:
+                    self.memo.move_to_end(key)
+            if fingerprints[key] is None:
+                # Missing or unreadable: a failed result, as goal3 reports it, not "0 events"
+                results[file_index] = pion_analysis.failed_result(
+                    file_index, path, FileNotFoundError(f"no such Set file or event store: {path}"), species_names)
+            elif not fresh and known is not None and known[0] == fingerprints[key]:
+                results[file_index] = dict(known[1], file_index=file_index, path=path)
+                remembered += 1
+            else:
+                pending.append((file_index, path))
+
+        # Same plan as goal3: largest first, big text files in chunks; only whole files need the batch size
+        futures = {}
+        for unit in scheduler.plan_units(pending, species_names, self.workers):
+            if unit[0] == 'file':
+                futures[self.executor.submit(cluster.run_unit, unit + (batch_size,))] = None
+            else:
+                futures[self.executor.submit(cluster.run_unit, unit)] = (unit[1], unit[2])
+        chunk_results = {}
+        for future, chunk_of in futures.items():
+            result = future.result()
+            if chunk_of is None:
+                results[result['file_index']] = result
+            else:
+                chunk_results.setdefault(chunk_of, []).append(result)
+        for (file_index, path), parts in chunk_results.items():
+            results[file_index] = chunking.merge_chunks(file_index, path, parts, batch_size, species_names)
+
+        for file_index, path in pending:
+            key = (os.path.abspath(path), species_names, batch_size)
+            if not pion_analysis.is_partial(results[file_index]):
+                self.remember(key, fingerprints[key], results[file_index])
+        return [results[file_index] for file_index in sorted(results)], remembered
+
+    def handle(self, job):
+        command = job.get('command') if isinstance(job, dict) else None
+        if command == 'ping':
+            return {'workers': self.pids, 'jobs': self.jobs, 'remembered': len(self.memo),
+                    'mapped': sorted(self.mapped), 'uptime': time.time() - self.started}
+        if command == 'analyze':
+            unknown = [name for name in job.get('species', ()) if not isinstance(name, str) or name not in species.SPECIES]
+            if unknown:
+                return {'error': f"unknown species: {', '.join(map(str, unknown))}"}
+            start = time.perf_counter()
+            results, remembered = self.analyze(job['paths'], job.get('species', ()), job.get('batch_size', 1000),
+                                               job.get('fresh', False))
+            self.jobs += 1
+            return {'results': results, 'remembered': remembered, 'seconds': time.perf_counter() - start}
+        return {'error': f"unknown command {command!r}"}
+
+
+def serve(address, workers, use_mmap=False, authkey=None):
+    service = AnalysisService(workers, use_mmap)
+    if os.path.exists(address):
+        os.remove(address)  # left behind by a service that did not shut down cleanly
+    authkey = authkey or service_authkey(address)
+    listener = Listener(address, family="AF_UNIX", authkey=authkey)
+    os.chmod(address, 0o600)
+    stopping = threading.Event()
+
+    def answer(connection):
+        with connection:
+            try:
+                job = connection.recv()
+                if isinstance(job, dict) and job.get('command') == 'shutdown':
+                    connection.send({'stopping': True})
+                    stopping.set()
+                    Client(address, family="AF_UNIX", authkey=authkey).close()  # wakes up accept()
+                    return
+                connection.send(service.handle(job))
+            except (EOFError, OSError):
+                pass  # the client went away
+            except Exception as error:  # a bad job must not take the service down
+                connection.send({'error': f"{type(error).__name__}: {error}"})
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # stop like on Ctrl-C
+    print(f"[INFO] goal3 service on {address} with {workers} warm worker(s)")
+    try:
+        while not stopping.is_set():
+            try:
+                connection = listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                continue  # a client that failed the handshake
+            threading.Thread(target=answer, args=(connection,), daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        service.close()
+        for path in (address, service_client.key_path(address)):
+            if os.path.exists(path):
+                os.remove(path)
+    print("[INFO] goal3 service stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm goal3 analysis service on a Unix socket")
+    parser.add_argument("--socket", default=service_client.SOCKET_PATH)
+    parser.add_argument("--workers", type=int, help="pool size (default: as goal3 picks it)")
+    parser.add_argument("--mmap", action="store_true", help="keep requested text files mapped and read ahead")
+    args = parser.parse_args()
+    serve(args.socket, args.workers or scheduler.pool_size(), args.mmap)
@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import sys
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+# Client side of the goal3 analysis service (service.py). Kept free of NumPy and
+# the analysis modules, so asking the warm daemon for a result costs a socket
+# round trip rather than an interpreter full of imports.
+#
+#   python Data_Science/service_client.py _Data/output-Set1.txt --species kaon+
+#   python Data_Science/service_client.py --ping
+#   python Data_Science/service_client.py --shutdown
+SOCKET_PATH = os.environ.get("GOAL3_SOCKET", "/tmp/goal3-service.sock")
+
+
+def key_path(address=SOCKET_PATH):
+    return address + ".key"
+
+
+def default_authkey(address=SOCKET_PATH):
+    # GOAL3_AUTHKEY if set, else the random key the service wrote next to its socket (owner-only).
+    # Raises FileNotFoundError when there is neither, i.e. no service is running.
+    key = os.environ.get("GOAL3_AUTHKEY")
+    if key:
+        return key.encode()
+    with open(key_path(address), "rb") as f:
+        return f.read().strip()
+
+
+def request(job, address=SOCKET_PATH, authkey=None):
+    # One job dict in, one reply dict out; the reply has 'error' when the service could not do it
+    with Client(address, family="AF_UNIX", authkey=authkey or default_authkey(address)) as connection:
+        connection.send(job)
+        return connection.recv()
+
+
+def analyze(paths, species_names=(), batch_size=1000, fresh=False, address=SOCKET_PATH, authkey=None):
+    return request({'command': 'analyze', 'paths': list(paths), 'species': list(species_names),
+                    'batch_size': batch_size, 'fresh': fresh}, address, authkey)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run goal3 on the warm analysis service")
+    parser.add_argument("paths", nargs="*", help="Set files or event stores")
+    parser.add_argument("--species", default="", help="comma-separated species to count as well")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--fresh", action="store_true", help="recompute even if the service remembers the result")
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--json", action="store_true", help="print the reply as JSON")
+    parser.add_argument("--ping", action="store_true", help="show the service status")
+    parser.add_argument("--shutdown", action="store_true", help="stop the service")
+    args = parser.parse_args()
+
+    try:
+        if args.ping or args.shutdown:
+            reply = request({'command': 'ping' if args.ping else 'shutdown'}, args.socket)
+        elif args.paths:
+            species_names = [name for name in args.species.split(",") if name]
+            reply = analyze(args.paths, species_names, args.batch_size, args.fresh, args.socket)
+        else:
+            parser.error("give Set files, --ping or --shutdown")
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"[ERROR] No analysis service at {args.socket} (start it with Data_Science/service.py)")
+        sys.exit(1)
+    except AuthenticationError:
+        print(f"[ERROR] The analysis service rejected the key (GOAL3_AUTHKEY or {key_path(args.socket)})")
+        sys.exit(1)
+
+    if args.json or 'results' not in reply:
+        print(json.dumps(reply, indent=2))
+    if 'error' in reply:
+        sys.exit(1)
+    if 'results' in reply and not args.json:
+        for result in reply['results']:
+            for message in result.get('read_report', {}).get('errors', []):
+                print(f"[ERROR] {result['path']}: {message}")
+            if result.get('failed'):
+                print(f"[RESULT] {result['path']}: failed, see the errors above")
+                continue
+            # A read error ends a file early, so what was read is only part of it
+            partial = " (partial)" if result.get('read_report', {}).get('errors') or result.get('stopped') else ""
+            print(f"[RESULT] {result['path']}{partial}: {result['stats']['pos']['n']} events, "
+                  f"pi+ {result['avg_pos']:.4f} ± {result['unc_pos']:.4f}, "
+                  f"pi- {result['avg_neg']:.4f} ± {result['unc_neg']:.4f}, σ {result['significance']:.2f}")
+            for name, total in result.get('species', {}).items():
+                events = result['stats']['pos']['n']
+                print(f"  {name}/event: {total / events if events else 0:.4f}")
+        print(f"[INFO] {reply['seconds'] * 1000:.1f} ms in the service, "
+              f"{reply['remembered']} of {len(reply['results'])} file(s) remembered")
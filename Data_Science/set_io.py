@@ -0,0 +1,228 @@
+import gzip
+import io
+import lzma
+import os
+import queue
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:  # .zst support is optional
+    zstandard = None
+
+# Opening Set files, plain or compressed (.gz, .zst, .xz), as binary streams.
+# Decompression runs in large blocks underneath a big read buffer rather than
+# line by line. Block-gzipped files (BGZF, as written by `bgzip`) can also be
+# decoded in parallel, since every block carries its own compressed size. The
+# decoders are threads (zlib lets go of the GIL while inflating), so a pool
+# worker reading a BGZF file does not start processes of its own. With read-ahead on, a background thread keeps reading raw
+# blocks while the caller parses, so disk waits and parsing overlap.
+COMPRESSED_SUFFIXES = (".gz", ".zst", ".xz")
+BLOCK_SIZE = 4 << 20
+# What a damaged or truncated file can raise while being read
+READ_ERRORS = (OSError, EOFError, zlib.error, lzma.LZMAError) + ((zstandard.ZstdError,) if zstandard else ())
+
+# Parallel decode threads used when open_set_binary is not told otherwise (0 = off)
+default_decode_workers = 0
+# Raw blocks a background thread may read ahead of the parser (0 = off)
+default_read_ahead = 0
+
+
+def is_compressed(path):
+    return path.endswith(COMPRESSED_SUFFIXES)
+
+
+def resolve_set_path(path):
+    # _Data/output-Set3.txt may be stored as output-Set3.txt.gz (or .zst/.xz)
+    if os.path.exists(path):
+        return path
+    for suffix in COMPRESSED_SUFFIXES:
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return path
+
+
+def open_binary(path, block_size=BLOCK_SIZE):
+    if path.endswith(".gz"):
+        raw = gzip.open(path, "rb")
+    elif path.endswith(".xz"):
+        raw = lzma.open(path, "rb")
+    elif path.endswith(".zst"):
+        if zstandard is None:
+            raise IOError(f"{path}: reading .zst files needs the 'zstandard' package")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb", buffering=block_size), read_size=block_size,
+                                                         closefd=True)
+    else:
+        return open(path, "rb", buffering=block_size)
+    return io.BufferedReader(raw, buffer_size=block_size)
+
+
+def open_set_binary(path, block_size=BLOCK_SIZE, decode_workers=None, read_ahead=None):
+    # Binary stream of the decompressed file, for readers that track byte offsets
+    if decode_workers is None:
+        decode_workers = default_decode_workers
+    if read_ahead is None:
+        read_ahead = default_read_ahead
+    if decode_workers > 1 and path.endswith(".gz") and is_bgzf(path):
+        binary = io.BufferedReader(ChunkStream(parallel_decompress(path, decode_workers)), buffer_size=block_size)
+    else:
+        binary = open_binary(path, block_size)
+    if read_ahead > 0:
+        binary = io.BufferedReader(ChunkStream(read_ahead_blocks(binary, block_size, read_ahead)),
+                                   buffer_size=block_size)
+    return binary
+
+
+# === Read-ahead: disk reads (and decompression) overlap with parsing ===
+def read_ahead_blocks(binary, block_size=BLOCK_SIZE, depth=4):
+    # A reader thread fills a queue of at most `depth` raw blocks while the caller
+    # parses the previous ones. Closing the generator stops the thread and closes binary.
+    blocks = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def reader():
+        try:
+            while not stop.is_set():
+                block = binary.read(block_size)
+                put(block)
+                if not block:
+                    return
+        except Exception as error:  # handed to the consumer and raised there
+            put(error)
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            block = blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                return
+            yield block
+    finally:
+        stop.set()
+        thread.join()
+        binary.close()
+
+
+# === BGZF: gzip members with the compressed block size in the header ===
+# The empty block bgzip writes last; a file without it was cut short
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+
+def is_bgzf(path):
+    with open(path, "rb") as f:
+        header = f.read(18)
+    # gzip magic, deflate, FEXTRA flag, then the 'BC' subfield of length 2
+    return (len(header) == 18 and header[:4] == b"\x1f\x8b\x08\x04"
+            and header[12:14] == b"BC" and struct.unpack("<H", header[14:16])[0] == 2)
+
+
+def bgzf_blocks(path):
+    # (offset, size) of every block, read from the headers alone. Raises EOFError, as gzip does
+    # for a truncated file, where a block runs past the end or the closing empty block is missing.
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        offset = 0
+        last = None
+        while offset < size:
+            header = f.read(18)
+            block_size = struct.unpack("<H", header[16:18])[0] + 1 if len(header) == 18 else None
+            if block_size is None or offset + block_size > size:
+                raise EOFError(f"BGZF block at byte {offset} runs past the end of the file")
+            yield offset, block_size
+            last = offset
+            offset += block_size
+            f.seek(offset)
+        closing = b""
+        if last is not None:
+            f.seek(last)
+            closing = f.read(size - last)
+        if closing != BGZF_EOF:
+            raise EOFError("BGZF end-of-file block missing, the file is truncated")
+
+
+def decode_blocks(args):
+    path, offset, length = args
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    parts = []
+    while data:
+        decoder = zlib.decompressobj(wbits=31)
+        parts.append(decoder.decompress(data))
+        if not decoder.eof:
+            raise EOFError(f"gzip member in bytes {offset}..{offset + length} ends early")
+        data = decoder.unused_data
+    return b"".join(parts)
+
+
+def parallel_decompress(path, workers, group_size=BLOCK_SIZE):
+    # Groups consecutive blocks into ~group_size byte jobs and yields their output in file order.
+    # A damaged file yields what its whole blocks hold and then raises, like a sequential read.
+    jobs = []
+    start = None
+    end = 0
+    damage = None
+    try:
+        for offset, size in bgzf_blocks(path):
+            if start is None:
+                start = offset
+            end = offset + size
+            if end - start >= group_size:
+                jobs.append((path, start, end - start))
+                start = None
+    except EOFError as error:
+        damage = error
+    if start is not None:
+        jobs.append((path, start, end - start))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Bounded look-ahead: at most 2 * workers decoded groups are held at a time
+        pending = []
+        for job in jobs:
+            pending.append(executor.submit(decode_blocks, job))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+    if damage is not None:
+        raise damage
+
+
+class ChunkStream(io.RawIOBase):
+    # Raw binary stream over an iterator of bytes chunks
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not len(self.buffer):
+            try:
+                self.buffer = memoryview(next(self.chunks))
+            except StopIteration:
+                return 0
+        size = min(len(target), len(self.buffer))
+        target[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+    def close(self):
+        if hasattr(self.chunks, "close"):
+            self.chunks.close()
+        super().close()
@@ -0,0 +1,250 @@
+from itertools import repeat
+
+import set_io
+
+# Record-level reading of Set files that survives damaged input. A record is a
+# header line "event_id num_particles" followed by num_particles particle lines
+# "px py pz pdg". In lenient mode (the default) bad records are skipped and
+# counted with their byte offsets, and reading resumes at the next valid header;
+# in strict mode the first one raises MalformedRecordError.
+#
+# Offsets are in the decompressed stream, so for plain text they are file offsets.
+MAX_EXAMPLES = 100  # malformed records kept with their offsets; all of them are counted
+TAKE_LINES = 1024  # particle lines read per step, whatever count the header claims
+
+# Used by readers that are not told otherwise; goal3 hands --strict to its workers with each work unit
+default_strict = False
+
+
+def three_spaces(lines, block):
+    # True when every line holds exactly three spaces, the test that lets a run of lines skip the
+    # per-line checks; block is the lines joined. The total alone is not enough: a header line (one
+    # space) can hide next to a line with five. Empty fields ("1  2 3") still pass and are left to
+    # the decoders, whose per-line rules make such a particle a non-pion.
+    return block.count(b" ") == 3 * len(lines) and min(map(bytes.count, lines, repeat(b" "))) == 3
+
+
+class MalformedRecordError(ValueError):
+
+    def __init__(self, path, offset, reason):
+        super().__init__(f"{path}: byte {offset}: {reason}")
+        self.path = path
+        self.offset = offset
+        self.reason = reason
+
+
+class ReadReport:
+    # What a reader skipped (malformed records) and why it stopped early (errors)
+
+    def __init__(self):
+        self.malformed = 0
+        self.reasons = {}
+        self.examples = []
+        self.errors = []
+
+    def add(self, offset, reason, detail=""):
+        self.malformed += 1
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        if len(self.examples) < MAX_EXAMPLES:
+            self.examples.append((offset, f"{reason}: {detail}" if detail else reason))
+
+    def error(self, message):
+        self.errors.append(message)
+
+    def merge(self, other):
+        self.malformed += other.malformed
+        for reason, count in other.reasons.items():
+            self.reasons[reason] = self.reasons.get(reason, 0) + count
+        self.examples = sorted(self.examples + other.examples)[:MAX_EXAMPLES]
+        self.errors += other.errors
+        return self
+
+    def __bool__(self):
+        return bool(self.malformed or self.errors)
+
+    def to_dict(self):
+        return {'malformed': self.malformed, 'reasons': dict(self.reasons),
+                'examples': [list(example) for example in self.examples], 'errors': list(self.errors)}
+
+    @classmethod
+    def from_dict(cls, data):
+        report = cls()
+        report.malformed = data['malformed']
+        report.reasons = dict(data['reasons'])
+        report.examples = [tuple(example) for example in data['examples']]
+        report.errors = list(data['errors'])
+        return report
+
+
+def parse_header(line):
+    # (event_id, num_particles), or None when the line is not a valid header
+    parts = line.split()
+    if len(parts) != 2:
+        return None
+    try:
+        event_id = int(parts[0])
+        num_particles = int(parts[1])
+    except ValueError:
+        return None
+    return (event_id, num_particles) if num_particles >= 0 else None
+
+
+def iter_records(f, path="", strict=None, report=None, start=0, end=None, select=None, raw=False, offsets=None):
+    # f: binary stream positioned at byte `start`. Yields (index, event_id, particles) for every
+    # complete record whose header starts before `end`; index counts the records yielded before it.
+    # select(index) -> False skips storing that record's particles (particles is then None).
+    # raw=True yields particles as one bytes block instead, every line ending in a newline.
+    # offsets, if given, is a list that gets the header's byte offset of every record yielded.
+    if strict is None:
+        strict = default_strict
+    if report is None:
+        report = ReadReport()
+
+    def malformed(offset, reason, detail=""):
+        if strict:
+            raise MalformedRecordError(path, offset, f"{reason}: {detail}" if detail else reason)
+        report.add(offset, reason, detail)
+
+    readline = f.readline
+    pending = []  # lines read ahead of a record that turned out short; they are consumed first
+
+    def take(count):
+        # Up to count particle lines, read TAKE_LINES at a time so a bogus count costs no more than
+        # the data behind it. Stops at the end of the data and before the first line that parses as
+        # a header, which goes back to pending with the lines after it. A run that passes three_spaces
+        # (the fast path's test) is taken as it is; any other run is checked line by line.
+        # Returns the lines and their bytes joined into one block.
+        lines = []
+        parts = []
+        while len(lines) < count:
+            wanted = min(count - len(lines), TAKE_LINES)
+            run = pending[:wanted]
+            del pending[:wanted]
+            run += [readline() for _ in range(wanted - len(run))]
+            joined = b"".join(run)
+            if run[-1] and three_spaces(run, joined):
+                lines += run
+                parts.append(joined)
+                continue
+            for i, line in enumerate(run):
+                if not line:
+                    return lines, b"".join(parts)
+                if line.count(b" ") != 3 and parse_header(line) is not None:
+                    pending[:0] = run[i:]
+                    return lines, b"".join(parts)
+                lines.append(line)
+                parts.append(line)
+        return lines, b"".join(parts)
+
+    position = start  # offset of the next line to be consumed
+    bad_run = None  # (offset, lines) of unparseable lines before the next header
+    index = 0
+    while end is None or position < end:
+        line_start = position
+        line = pending.pop(0) if pending else readline()
+        if not line:
+            break
+        position += len(line)
+        header = parse_header(line)
+        if header is None:
+            if not line.strip():
+                continue  # blank lines between records are harmless
+            if strict:
+                malformed(line_start, "bad header", line[:40].decode(errors="replace").strip())
+            bad_run = (line_start, 1) if bad_run is None else (bad_run[0], bad_run[1] + 1)
+            continue
+        if bad_run is not None:
+            malformed(bad_run[0], "bad header", f"skipped {bad_run[1]} line(s) to resync at byte {line_start}")
+            bad_run = None
+
+        event_id, num_particles = header
+        keep = select is None or select(index)
+        if not num_particles:
+            if offsets is not None:
+                offsets.append(line_start)
+            yield index, event_id, (b"" if raw else []) if keep else None
+            index += 1
+            continue
+        if num_particles <= TAKE_LINES and not pending:
+            lines = [readline() for _ in range(num_particles)]
+            block = b"".join(lines)
+            # Fast path: the last line is complete (so all are) and every line holds three spaces
+            last = lines[-1]
+            if last[-1:] == b"\n" and last[-2:] != b"\r\n" and three_spaces(lines, block):
+                position += len(block)
+                if not keep:
+                    particles = None
+                elif raw:
+                    particles = block
+                else:
+                    particles = block.decode(errors="replace").split("\n")[:-1]
+                if offsets is not None:
+                    offsets.append(line_start)
+                yield index, event_id, particles
+                index += 1
+                continue
+            pending[:] = lines  # anything unusual is read again through take()
+        lines, block = take(num_particles)
+        if len(lines) < num_particles:
+            position += len(block)
+            if pending:
+                # The next record starts inside this one's particle block
+                malformed(line_start, "short particle block", f"event {event_id}: {len(lines)} of "
+                                                              f"{num_particles} particles")
+            else:
+                malformed(line_start, "truncated event", f"event {event_id}: end of data after {len(lines)} of "
+                                                         f"{num_particles} particles")
+            continue
+
+        # Slow path: a line without four fields makes the whole record malformed, so it is skipped
+        bad = next((i for i, line in enumerate(lines) if len(line.split()) != 4), None)
+        if bad is not None:
+            bad_offset = position + sum(len(line) for line in lines[:bad])
+            malformed(bad_offset, "bad particle line", f"event {event_id}: {len(lines[bad].split())} fields")
+            position += len(block)
+            continue
+        position += len(block)
+        if not keep:
+            particles = None
+        elif raw:
+            particles = b"".join([line.strip() + b"\n" for line in lines])
+        else:
+            particles = [line.decode(errors="replace").strip() for line in lines]
+        if offsets is not None:
+            offsets.append(line_start)
+        yield index, event_id, particles
+        index += 1
+    if bad_run is not None:
+        malformed(bad_run[0], "bad header", f"{bad_run[1]} trailing line(s)")
+
+
+def read_records(path, strict=None, report=None, select=None, read_ahead=None, decode_workers=None, raw=False):
+    # iter_records over a whole (possibly compressed) Set file. Read errors raise in strict mode;
+    # otherwise they end the file early and are noted in report.errors.
+    if strict is None:
+        strict = default_strict
+    try:
+        with set_io.open_set_binary(path, decode_workers=decode_workers, read_ahead=read_ahead) as f:
+            yield from iter_records(f, path, strict, report, select=select, raw=raw)
+    except set_io.READ_ERRORS as error:
+        if strict:
+            raise
+        if isinstance(error, FileNotFoundError):
+            print(f"[ERROR] File not found: {path}")
+        else:
+            print(f"[ERROR] Error reading file: {path}: {error}")
+        if report is not None:
+            report.error(f"{type(error).__name__}: {error}")
+
+
+def describe(report, path):
+    # One line per problem for the end-of-run summary
+    lines = []
+    if report.malformed:
+        reasons = ", ".join(f"{count} {reason}" for reason, count in sorted(report.reasons.items()))
+        lines.append(f"[WARN] {path}: skipped {report.malformed} malformed record(s) ({reasons})")
+        for offset, reason in report.examples[:5]:
+            lines.append(f"         byte {offset}: {reason}")
+    for message in report.errors:
+        lines.append(f"[ERROR] {path}: {message}")
+    return lines
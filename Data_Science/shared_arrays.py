@@ -0,0 +1,167 @@
+import os
+from collections import deque
+from multiprocessing import shared_memory
+import numpy as np
+
+import accumulators
+import event_store
+import particles
+import pion_analysis
+import profiling
+import set_io
+import set_records
+import species
+
+# One reader, many analyzers: the parent parses Set files into NumPy columns,
+# copies each segment of events into a multiprocessing.shared_memory block and
+# hands workers only (block name, offset, length) descriptors. Nothing but those
+# descriptors and the small per-segment results crosses the process boundary.
+SEGMENT_EVENTS = 100000  # multiple of the 1000-event batch, so batches never straddle segments
+
+
+def read_segments(path, segment_events=SEGMENT_EVENTS, batch_size=1000, report=None, settings=None):
+    # Yields (counts, pdg) arrays for consecutive runs of segment_events events
+    settings = settings or {}
+    if event_store.is_store(path):
+        store = event_store.load_store(path)
+        offsets = store['offsets']
+        for first in range(0, store['num_events'], segment_events):
+            last = min(first + segment_events, store['num_events'])
+            yield np.diff(offsets[first:last + 1]), np.asarray(store['pdg'][offsets[first]:offsets[last]])
+        return
+    counts_parts = []
+    pdg_parts = []
+    num_events = 0
+    for batch in particles.read_event_blocks(path, batch_size=batch_size, read_ahead=settings.get('read_ahead'),
+                                             strict=settings.get('strict'), report=report,
+                                             decode_workers=settings.get('decode_workers')):
+        pdg, counts = particles.batch_pdg_array(batch)
+        counts_parts.append(counts)
+        pdg_parts.append(pdg)
+        num_events += len(counts)
+        if num_events >= segment_events:
+            yield np.concatenate(counts_parts), np.concatenate(pdg_parts)
+            counts_parts, pdg_parts, num_events = [], [], 0
+    if counts_parts:
+        yield np.concatenate(counts_parts), np.concatenate(pdg_parts)
+
+
+def share_columns(columns):
+    # Packs the arrays into one shared block; returns the block and one descriptor per column
+    sizes = [array.nbytes for array in columns.values()]
+    block = shared_memory.SharedMemory(create=True, size=max(1, sum(sizes)))
+    descriptors = {}
+    offset = 0
+    for (name, array), size in zip(columns.items(), sizes):
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf, offset=offset)
+        view[:] = array
+        descriptors[name] = (block.name, offset, len(array), array.dtype.str)
+        offset += size
+    return block, descriptors
+
+
+def attach(block_name):
+    # Pool workers share the parent's resource tracker, so attaching here does not
+    # register a second owner and the parent's unlink() stays the only cleanup
+    return shared_memory.SharedMemory(name=block_name)
+
+
+def column_view(block, descriptor):
+    _, offset, length, dtype = descriptor
+    return np.ndarray((length,), dtype=np.dtype(dtype), buffer=block.buf, offset=offset)
+
+
+@profiling.cprofiled
+def analyze_segment(descriptors, batch_size=1000, species_names=(), settings=None):
+    block = attach(descriptors['counts'][0])
+    try:
+        profile = profiling.start(descriptors['counts'][0], (settings or {}).get('profile'))
+        counts = column_view(block, descriptors['counts'])
+        pdg = column_view(block, descriptors['pdg'])
+        event_pos, event_neg = particles.count_pions(pdg, counts)
+        profile.lap('count')
+        stats = accumulators.PionAccumulator().add_events(event_pos, event_neg)
+        starts = np.arange(0, len(counts), batch_size)
+        batch_pos = np.add.reduceat(event_pos, starts) if len(counts) else np.zeros(0, dtype=np.int64)
+        batch_neg = np.add.reduceat(event_neg, starts) if len(counts) else np.zeros(0, dtype=np.int64)
+        result = {
+            'events': len(counts),
+            'batch_pos': [int(x) for x in batch_pos],
+            'batch_neg': [int(x) for x in batch_neg],
+            'stats': stats.to_dict(),
+        }
+        profile.lap('stats')
+        result['species'] = species.DEFAULT_TABLE.totals(pdg, species_names)
+        profile.lap('species')
+        profile.finish(len(counts), counts.nbytes + pdg.nbytes)
+        del counts, pdg, event_pos, event_neg  # views into the block must go before close()
+        return profiling.attach(result, profile)
+    finally:
+        block.close()
+
+
+def merge_segments(file_index, path, segments, report=None, species_names=()):
+    batch_pos_list = [x for segment in segments for x in segment['batch_pos']]
+    batch_neg_list = [x for segment in segments for x in segment['batch_neg']]
+    stats = accumulators.PionAccumulator.combine(
+        accumulators.PionAccumulator.from_dict(segment['stats']) for segment in segments)
+    # Starts from the requested names, so a file without events still reports them
+    species_totals = dict.fromkeys(species_names, 0)
+    for segment in segments:
+        for name, count in segment['species'].items():
+            species_totals[name] += count
+    result = pion_analysis.build_result(file_index, path, sum(batch_pos_list), sum(batch_neg_list),
+                                        sum(segment['events'] for segment in segments),
+                                        batch_pos_list, batch_neg_list, stats.to_dict())
+    result = pion_analysis.finish_result(result, False, species_totals, report)
+    if any('profile' in segment for segment in segments):
+        result['profile'] = [profile for segment in segments for profile in segment.get('profile', [])]
+    return result
+
+
+def run_pipeline(executor, jobs, max_in_flight=None, segment_events=SEGMENT_EVENTS, species_names=(), settings=None):
+    # jobs: (file_index, path) pairs. The parent reads while the pool analyzes; at most
+    # max_in_flight segments (and their shared blocks) are alive at any time.
+    if max_in_flight is None:
+        max_in_flight = 2 * (os.cpu_count() or 1)
+    in_flight = deque()
+    segments = {}
+    reports = {}
+    failures = {}
+
+    def retire():
+        key, block, future = in_flight.popleft()
+        try:
+            segments[key[:2]][key[2]] = future.result()
+        finally:
+            block.close()
+            block.unlink()
+
+    try:
+        for file_index, path in jobs:
+            segments[(file_index, path)] = {}
+            report = reports[(file_index, path)] = set_records.ReadReport()
+            try:
+                for number, (counts, pdg) in enumerate(read_segments(path, segment_events, report=report, settings=settings)):
+                    block, descriptors = share_columns({'counts': counts, 'pdg': pdg})
+                    in_flight.append(((file_index, path, number), block,
+                                      executor.submit(analyze_segment, descriptors, 1000, species_names,
+                                                      settings=settings)))
+                    while len(in_flight) >= max_in_flight:
+                        retire()
+            except (set_records.MalformedRecordError, event_store.DamagedStoreError) + set_io.READ_ERRORS as error:
+                # strict mode or a damaged store; the other files go on
+                failures[(file_index, path)] = error
+        while in_flight:
+            retire()
+    finally:
+        for _, block, future in in_flight:
+            future.cancel()
+            block.close()
+            block.unlink()
+
+    return [pion_analysis.failed_result(file_index, path, failures[(file_index, path)], species_names,
+                                        reports[(file_index, path)]) if (file_index, path) in failures
+            else merge_segments(file_index, path, [parts[n] for n in sorted(parts)], reports[(file_index, path)],
+                                species_names)
+            for (file_index, path), parts in segments.items()]
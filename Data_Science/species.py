@@ -0,0 +1,77 @@
+import numpy as np
+
+# PDG code -> particle species, as one dense lookup array instead of if/elif chains.
+# Species id 0 is "other"; ids 1.. follow the order of SPECIES.
+SPECIES = {
+    'pion+': (211,),
+    'pion-': (-211,),
+    'pion0': (111,),
+    'kaon+': (321,),
+    'kaon-': (-321,),
+    'kaon0': (311, -311, 130, 310),
+    'proton': (2212,),
+    'antiproton': (-2212,),
+    'neutron': (2112,),
+    'antineutron': (-2112,),
+    'photon': (22,),
+    'electron': (11,),
+    'positron': (-11,),
+    'muon-': (13,),
+    'muon+': (-13,),
+}
+OTHER = 'other'
+PION_CHARGE = {'pion+': 1, 'pion-': -1}
+
+
+class SpeciesTable:
+    # Dense array over [-max_code, max_code]; codes outside it are always "other"
+
+    def __init__(self, species=SPECIES):
+        self.names = [OTHER] + list(species)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.max_code = max(abs(code) for codes in species.values() for code in codes)
+        self.lookup = np.zeros(2 * self.max_code + 1, dtype=np.int8 if len(self.names) < 128 else np.int16)
+        for name, codes in species.items():
+            for code in codes:
+                self.lookup[code + self.max_code] = self.ids[name]
+
+    def classify(self, pdg):
+        # Species id for every entry of a pdg array
+        pdg = np.asarray(pdg, dtype=np.int64)
+        inside = (pdg >= -self.max_code) & (pdg <= self.max_code)  # np.abs(-2**63) overflows to itself
+        ids = np.zeros(pdg.shape, dtype=self.lookup.dtype)
+        ids[inside] = self.lookup[pdg[inside] + self.max_code]
+        return ids
+
+    def name_of(self, pdg_code):
+        try:
+            if pdg_code != int(pdg_code) or abs(pdg_code) > self.max_code:
+                return OTHER
+        except (ValueError, OverflowError):  # nan or inf read from a float column
+            return OTHER
+        return self.names[self.lookup[int(pdg_code) + self.max_code]]
+
+    def count_per_event(self, pdg, counts):
+        # (num_events, num_species) matrix of counts, column i for species id i
+        num_events = len(counts)
+        event_of = np.repeat(np.arange(num_events), counts)
+        flat = np.bincount(event_of * len(self.names) + self.classify(pdg),
+                           minlength=num_events * len(self.names))
+        return flat.reshape(num_events, len(self.names))
+
+    def totals(self, pdg, names):
+        # Total count of each named species in one pass over pdg
+        found = np.bincount(self.classify(pdg), minlength=len(self.names))
+        return {name: int(found[self.ids[name]]) for name in names}
+
+
+DEFAULT_TABLE = SpeciesTable()
+
+
+def species_name(pdg_code):
+    return DEFAULT_TABLE.name_of(pdg_code)
+
+
+def pion_charge(pdg_code):
+    # 1 for pion+, -1 for pion-, 0 otherwise (what check_type returns in goal2/goal3)
+    return PION_CHARGE.get(species_name(pdg_code), 0)
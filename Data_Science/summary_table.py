@@ -0,0 +1,283 @@
+import argparse
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+import event_store
+import goal1
+import result_cache
+import set_io
+import species
+
+# Per-event summary rows for every Set file, written once to a columnar table
+# (one raw .bin per column plus meta.json, like event_store). Follow-up questions
+# are then answered from these few bytes per event with filter / group-by /
+# aggregate, without going back to the raw text.
+#
+#   python Data_Science/summary_table.py build
+#   python Data_Science/summary_table.py query --where "n_particles > 20" --by set --agg n_pos:mean n_neg:mean
+#
+# --where takes comparisons of a column with a number joined by and / or, e.g.
+# "n_particles > 20 and n_pi0 == 0 or set == 3" (and binds tighter than or).
+TABLE_PATH = "_Data/summary.table"
+COLUMNS = {
+    'set': np.int16,
+    'event_index': np.int64,  # position of the event inside its set, so batch = event_index // batch_size
+    'event_id': np.int64,
+    'n_particles': np.int32,
+    'n_pos': np.int32,
+    'n_neg': np.int32,
+    'n_pi0': np.int32,
+    'sum_pt': np.float64,
+}
+AGGREGATES = ('count', 'sum', 'mean', 'std', 'min', 'max')
+COMPARISONS = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+               '==': np.equal, '!=': np.not_equal}
+CONDITION = re.compile(r"\s*([A-Za-z_]\w*)\s*(<=|>=|==|!=|<|>)\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*")
+
+
+# === Construirea tabelului ===
+def summarize_file(args):
+    # Worker: one streaming pass over a Set file or event store -> summary columns of that set
+    set_number, path, batch_size = args
+    table = species.DEFAULT_TABLE
+    wanted = [table.ids['pion+'], table.ids['pion-'], table.ids['pion0']]
+    parts = {name: [] for name in COLUMNS}
+    num_events = 0
+    for columns in event_store.iter_columns(path, batch_size):
+        counts = columns['counts']
+        per_species = table.count_per_event(columns['pdg'], counts)[:, wanted]
+        pt = goal1.calculate_pT_array(columns['px'], columns['py'])
+        event_of = np.repeat(np.arange(len(counts)), counts)
+        # Particles whose momentum did not parse (nan) add nothing to sum_pt
+        sum_pt = np.bincount(event_of, weights=np.nan_to_num(pt, nan=0.0), minlength=len(counts))
+        parts['set'].append(np.full(len(counts), set_number))
+        parts['event_index'].append(num_events + np.arange(len(counts)))
+        parts['event_id'].append(columns['event_id'])
+        parts['n_particles'].append(counts)
+        parts['n_pos'].append(per_species[:, 0])
+        parts['n_neg'].append(per_species[:, 1])
+        parts['n_pi0'].append(per_species[:, 2])
+        parts['sum_pt'].append(sum_pt)
+        num_events += len(counts)
+    return set_number, path, {name: np.concatenate(arrays).astype(COLUMNS[name]) if arrays
+                              else np.zeros(0, dtype=COLUMNS[name]) for name, arrays in parts.items()}
+
+
+def build_table(paths, table_path=TABLE_PATH, batch_size=1000, executor=None):
+    # paths: {set_number: path}. Rows are written by set, then event, whichever worker finishes first.
+    os.makedirs(table_path, exist_ok=True)
+    meta_path = os.path.join(table_path, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    tasks = [(set_number, path, batch_size) for set_number, path in sorted(paths.items())]
+    if executor is not None:
+        results = [future.result() for future in as_completed([executor.submit(summarize_file, task)
+                                                                 for task in tasks])]
+    else:
+        results = map(summarize_file, tasks)
+    # Each set's rows are already in event order
+    results = sorted(results, key=lambda result: result[0])
+
+    files = {name: open(os.path.join(table_path, name + ".bin"), "wb") for name in COLUMNS}
+    num_rows = 0
+    sources = {}
+    try:
+        for set_number, path, columns in results:
+            for name in COLUMNS:
+                columns[name].tofile(files[name])
+            sources[str(set_number)] = {'path': os.path.abspath(path), 'first_row': num_rows,
+                                        'num_events': len(columns['event_id']),
+                                        'fingerprint': result_cache.file_fingerprint(path)}
+            num_rows += len(columns['event_id'])
+    finally:
+        for f in files.values():
+            f.close()
+
+    meta = {
+        'num_rows': num_rows,
+        'batch_size': batch_size,
+        'sources': sources,
+        'columns': {name: np.dtype(dtype).str for name, dtype in COLUMNS.items()},
+    }
+    # meta.json last, as in event_store, so a half-written table is never loaded
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    return table_path
+
+
+def is_table_current(table_path, paths, batch_size=1000):
+    try:
+        with open(os.path.join(table_path, "meta.json"), "r") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return False
+    if meta.get('batch_size') != batch_size:
+        return False  # --by batch would group differently
+    sources = meta['sources']
+    if set(sources) != {str(set_number) for set_number in paths}:
+        return False
+    for set_number, path in paths.items():
+        source = sources[str(set_number)]
+        if source['path'] != os.path.abspath(path) or not os.path.exists(path):
+            return False
+        if source['fingerprint'] != result_cache.file_fingerprint(path):
+            return False
+    return True
+
+
+# === Interogări ===
+class SummaryTable:
+    # Memory-mapped columns plus an optional row selection; filters return new views
+
+    def __init__(self, columns, batch_size, rows=None):
+        self.columns = columns
+        self.batch_size = batch_size
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.columns['set']) if self.rows is None else len(self.rows)
+
+    def __getitem__(self, name):
+        if name == 'batch':
+            return self['event_index'] // self.batch_size
+        column = self.columns[name]
+        return np.asarray(column) if self.rows is None else column[self.rows]
+
+    def where(self, mask):
+        # mask: boolean array over the current rows, e.g. table['n_particles'] > 20
+        mask = np.asarray(mask, dtype=bool)
+        rows = np.flatnonzero(mask) if self.rows is None else self.rows[mask]
+        return SummaryTable(self.columns, self.batch_size, rows)
+
+    def group_codes(self, by):
+        # by: None (one group), 'set', 'batch' (per set) or any column name
+        if by is None:
+            return [()], np.zeros(len(self), dtype=np.int64)
+        if by == 'batch':
+            keys = np.stack([self['set'].astype(np.int64), self['batch']], axis=1)
+            unique, codes = np.unique(keys, axis=0, return_inverse=True)
+            return [tuple(int(x) for x in key) for key in unique], codes.reshape(-1)
+        unique, codes = np.unique(self[by], return_inverse=True)
+        return [key.item() for key in unique], codes.reshape(-1)
+
+    def aggregate(self, aggregates, by=None):
+        # aggregates: {column: aggregate or [aggregates]} with aggregates from AGGREGATES.
+        # Returns {group key: {'column:aggregate': value}}; the key is () without by.
+        keys, codes = self.group_codes(by)
+        num_groups = len(keys)
+        counts = np.bincount(codes, minlength=num_groups)
+        out = {'count': counts}
+        for column, wanted in aggregates.items():
+            wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+            unknown = [name for name in wanted if name not in AGGREGATES]
+            if unknown:
+                raise ValueError(f"unknown aggregate: {', '.join(unknown)}")
+            if column not in self.columns and column != 'batch':
+                raise ValueError(f"unknown column {column!r}")
+            values = self[column].astype(np.float64)
+            sums = np.bincount(codes, weights=values, minlength=num_groups)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = sums / counts
+                for name in wanted:
+                    if name == 'count':
+                        result = counts
+                    elif name == 'sum':
+                        result = sums
+                    elif name == 'mean':
+                        result = means
+                    elif name == 'std':
+                        squares = np.bincount(codes, weights=(values - means[codes]) ** 2, minlength=num_groups)
+                        result = np.sqrt(squares / (counts - 1))
+                    else:
+                        result = np.full(num_groups, np.inf if name == 'min' else -np.inf)
+                        (np.minimum if name == 'min' else np.maximum).at(result, codes, values)
+                    out[f"{column}:{name}"] = result
+        return {key: {name: values[i].item() for name, values in out.items()} for i, key in enumerate(keys)}
+
+
+def load_table(table_path=TABLE_PATH):
+    with open(os.path.join(table_path, "meta.json"), "r") as f:
+        meta = json.load(f)
+    columns = {}
+    for name, dtype in meta['columns'].items():
+        if meta['num_rows'] == 0:
+            columns[name] = np.zeros(0, dtype=dtype)  # np.memmap refuses empty files
+        else:
+            columns[name] = np.memmap(os.path.join(table_path, name + ".bin"), dtype=dtype, mode="r",
+                                      shape=(meta['num_rows'],))
+    return SummaryTable(columns, meta['batch_size'])
+
+
+def parse_where(table, expression):
+    # "n_particles > 20 and n_pi0 == 0 or set == 3" -> boolean mask over the table's rows
+    mask = np.zeros(len(table), dtype=bool)
+    for alternative in re.split(r"\bor\b", expression):
+        selected = np.ones(len(table), dtype=bool)
+        for condition in re.split(r"\band\b", alternative):
+            match = CONDITION.fullmatch(condition)
+            if match is None:
+                raise ValueError(f"cannot read condition {condition.strip()!r}, expected COLUMN OP NUMBER")
+            column, operator, number = match.groups()
+            if column not in table.columns and column != 'batch':
+                raise ValueError(f"unknown column {column!r}")
+            value = int(number) if re.fullmatch(r"[-+]?\d+", number) else float(number)
+            selected &= COMPARISONS[operator](table[column], value)
+        mask |= selected
+    return mask
+
+
+def default_paths():
+    # _Data/output-Set1..10, preferring up-to-date event stores; missing sets are left out
+    paths = {}
+    for i in range(1, 11):
+        path = event_store.choose_path(set_io.resolve_set_path(f"_Data/output-Set{i}.txt"))
+        if os.path.exists(path):
+            paths[i] = path
+        else:
+            print(f"[WARN] File not found, left out of the table: {path}")
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-event summary table over all Set files")
+    parser.add_argument("command", choices=("build", "query"))
+    parser.add_argument("--table", default=TABLE_PATH, help="table directory")
+    parser.add_argument("--batch-size", type=int, default=1000, help="events per batch for --by batch (build)")
+    parser.add_argument("--force", action="store_true", help="rebuild even when the table is current (build)")
+    parser.add_argument("--where", help='row filter, e.g. "n_particles > 20 and n_pi0 == 0" (query)')
+    parser.add_argument("--by", help="group by set, batch or any column (query)")
+    parser.add_argument("--agg", nargs="*", default=["n_pos:mean", "n_neg:mean"],
+                        help="column:aggregate pairs, aggregates: " + ", ".join(AGGREGATES))
+    args = parser.parse_args()
+
+    if args.command == "build":
+        paths = default_paths()
+        if not args.force and is_table_current(args.table, paths, args.batch_size):
+            print(f"[INFO] {args.table} is up to date")
+        else:
+            with ProcessPoolExecutor() as executor:
+                build_table(paths, args.table, args.batch_size, executor)
+            print(f"[INFO] Summary table written to {args.table}")
+    else:
+        table = load_table(args.table)
+        if args.where:
+            try:
+                table = table.where(parse_where(table, args.where))
+            except ValueError as error:
+                parser.error(f"--where: {error}")
+        aggregates = {}
+        for item in args.agg:
+            column, _, name = item.partition(":")
+            # Checked here like --where's columns, so a typo is a usage error rather than a traceback
+            if column not in table.columns and column != 'batch':
+                parser.error(f"--agg: unknown column {column!r}")
+            if (name or 'sum') not in AGGREGATES:
+                parser.error(f"--agg: unknown aggregate {name!r}, expected one of {', '.join(AGGREGATES)}")
+            aggregates.setdefault(column, []).append(name or 'sum')
+        for key, values in table.aggregate(aggregates, args.by).items():
+            label = "all" if key == () else key
+            print(f"{label}: " + ", ".join(f"{name}={value:.6g}" for name, value in values.items()))
@@ -0,0 +1,200 @@
+import argparse
+import gzip
+import json
+import lzma
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Synthetic Set files with a known pion asymmetry, for testing and benchmarking
+# goal2/goal3 without the real data. Output is the exact Set format ("event_id
+# num_particles", then "px py pz pdg" lines with six decimals). Events are made
+# in blocks of BLOCK_EVENTS, each from its own child seed, so a file depends only
+# on its seed and the blocks can be built by several processes. Lines are
+# formatted with NumPy: every row is laid out in fixed-width slots, the unused
+# slots hold a 0 byte, and one boolean mask squeezes them out.
+#
+#   python Data_Science/synthetic.py _Data --sets 10 --events 200000 --asymmetry 0.01 --seed 1
+#   python Data_Science/synthetic.py /tmp/big --sets 1 --events 20000000 --multiplicity negbin:15:3 --workers 8
+BLOCK_EVENTS = 20000
+
+# Species drawn for non-pion particles, with their relative weights
+OTHER_CODES = np.array([111, 22, 321, -321, 2212, -2212, 11, -11, 2112, 130])
+OTHER_WEIGHTS = np.array([0.25, 0.35, 0.08, 0.07, 0.08, 0.02, 0.05, 0.04, 0.04, 0.02])
+PION_FRACTION = 0.5  # share of charged pions among all particles
+MOMENTUM_LIMIT = 999.999999  # keeps the integer part to three digits
+
+INT_DIGITS = 3  # the integer part is one THOUSANDS group
+FIELD_WIDTH = 1 + INT_DIGITS + 1 + 6  # sign, integer part, '.', decimals
+CODE_WIDTH = 6  # "-2212" and friends
+ROW_WIDTH = 3 * (FIELD_WIDTH + 1) + CODE_WIDTH + 1
+HEADER_DIGITS = 19  # any int64 event id
+
+
+def parse_multiplicity(text):
+    # "poisson:15", "negbin:15:3" (mean, shape k) or "fixed:12"
+    kind, *values = text.split(":")
+    values = [float(value) for value in values]
+    if kind not in ("poisson", "negbin", "fixed") or len(values) != (2 if kind == "negbin" else 1):
+        raise ValueError(f"unknown multiplicity distribution {text!r}")
+    return (kind, *values)
+
+
+def draw_multiplicities(rng, num_events, multiplicity):
+    kind, mean, *rest = multiplicity
+    if kind == "poisson":
+        return rng.poisson(mean, num_events)
+    if kind == "negbin":
+        k = rest[0]
+        return rng.negative_binomial(k, k / (k + mean), num_events)
+    return np.full(num_events, int(mean), dtype=np.int64)
+
+
+def digit_slots(values, width):
+    # ASCII digits of non-negative ints, right-aligned in `width` slots; leading zeros become 0 bytes
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    slots = (values[:, None] // powers % 10 + ord("0")).astype(np.uint8)
+    slots[(values[:, None] < powers) & (powers > 1)] = 0
+    return slots
+
+
+# Three-digit groups 000..999, with and without their leading zeros; a gather beats int64 division
+THOUSANDS = digit_slots(np.arange(1000), 3)
+THOUSANDS_PADDED = np.where(THOUSANDS == 0, ord("0"), THOUSANDS).astype(np.uint8)
+
+
+def code_slots(codes):
+    # Right-aligned pdg codes: each distinct code is formatted once and gathered
+    table, inverse = np.unique(codes, return_inverse=True)
+    formatted = np.zeros((len(table), CODE_WIDTH), dtype=np.uint8)
+    formatted[:, 1:] = digit_slots(np.abs(table), CODE_WIDTH - 1)
+    formatted[table < 0, 0] = ord("-")
+    return formatted[inverse.ravel()]
+
+
+def momentum_slots(values):
+    # "%.6f" of |x| < 1000 in FIELD_WIDTH slots
+    # Micro-units fit int32, whose division is much cheaper than int64's
+    micro = np.minimum(np.rint(np.abs(values) * 1e6), 10**(INT_DIGITS + 6) - 1).astype(np.int32)
+    slots = np.empty((len(values), FIELD_WIDTH), dtype=np.uint8)
+    slots[:, 0] = np.where((values < 0) & (micro > 0), ord("-"), 0)
+    slots[:, 1:1 + INT_DIGITS] = THOUSANDS[micro // 10**6]
+    slots[:, 1 + INT_DIGITS] = ord(".")
+    decimals = micro % 10**6
+    slots[:, 2 + INT_DIGITS:5 + INT_DIGITS] = THOUSANDS_PADDED[decimals // 1000]
+    slots[:, 5 + INT_DIGITS:] = THOUSANDS_PADDED[decimals % 1000]
+    return slots
+
+
+def format_block(event_ids, counts, momenta, codes):
+    # Set-format bytes of a block: one fixed-width row per header and per particle, then 0 bytes dropped
+    num_rows = len(counts) + len(codes)
+    rows = np.zeros((num_rows, ROW_WIDTH), dtype=np.uint8)
+    header_rows = np.arange(len(counts)) + np.concatenate(([0], np.cumsum(counts)[:-1]))
+    is_particle = np.ones(num_rows, dtype=bool)
+    is_particle[header_rows] = False
+
+    headers = rows[header_rows]
+    headers[:, :HEADER_DIGITS] = digit_slots(event_ids, HEADER_DIGITS)
+    headers[:, HEADER_DIGITS] = ord(" ")
+    headers[:, HEADER_DIGITS + 1:HEADER_DIGITS + 11] = digit_slots(counts, 10)
+    headers[:, HEADER_DIGITS + 11] = ord("\n")
+    rows[header_rows] = headers
+
+    particles = np.zeros((len(codes), ROW_WIDTH), dtype=np.uint8)
+    for axis in range(3):
+        first = axis * (FIELD_WIDTH + 1)
+        particles[:, first:first + FIELD_WIDTH] = momentum_slots(momenta[:, axis])
+        particles[:, first + FIELD_WIDTH] = ord(" ")
+    particles[:, 3 * (FIELD_WIDTH + 1):-1] = code_slots(codes)
+    particles[:, -1] = ord("\n")
+    rows[is_particle] = particles
+
+    flat = rows.ravel()
+    return flat[flat != 0].tobytes()
+
+
+def generate_block(args):
+    # Worker: one block of events -> (bytes, truth counts)
+    first_event, num_events, seed, multiplicity, asymmetry, momentum_sigma = args
+    rng = np.random.default_rng(seed)
+    counts = draw_multiplicities(rng, num_events, multiplicity).astype(np.int64)
+    num_particles = int(counts.sum())
+    # Charged pions with P(pi+) = (1 + A) / 2, the rest drawn from OTHER_CODES
+    is_pion = rng.random(num_particles) < PION_FRACTION
+    positive = rng.random(num_particles) < (1 + asymmetry) / 2
+    codes = rng.choice(OTHER_CODES, num_particles, p=OTHER_WEIGHTS / OTHER_WEIGHTS.sum())
+    codes[is_pion] = np.where(positive[is_pion], 211, -211)
+    momenta = np.clip(rng.normal(0.0, momentum_sigma, (num_particles, 3)), -MOMENTUM_LIMIT, MOMENTUM_LIMIT)
+    event_ids = np.arange(first_event, first_event + num_events, dtype=np.int64)
+    data = format_block(event_ids, counts, momenta, codes)
+    return data, {'events': num_events, 'particles': num_particles,
+                  'pi_plus': int(np.count_nonzero(codes == 211)), 'pi_minus': int(np.count_nonzero(codes == -211))}
+
+
+def open_output(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "wb", compresslevel=1)
+    if path.endswith(".xz"):
+        return lzma.open(path, "wb")
+    return open(path, "wb")
+
+
+def write_set_file(path, num_events, multiplicity=("poisson", 15), asymmetry=0.0, momentum_sigma=1.0, seed=0,
+                   executor=None):
+    # Writes one Set file; returns the truth: events, particles and pi+/pi- actually written
+    jobs = [(first, min(BLOCK_EVENTS, num_events - first), child, multiplicity, asymmetry, momentum_sigma)
+            for first, child in zip(range(0, num_events, BLOCK_EVENTS),
+                                    np.random.SeedSequence(seed).spawn(-(-num_events // BLOCK_EVENTS)))]
+    truth = {'events': 0, 'particles': 0, 'pi_plus': 0, 'pi_minus': 0}
+    with open_output(path) as f:
+        for data, counts in (executor.map(generate_block, jobs) if executor is not None else map(generate_block, jobs)):
+            f.write(data)
+            for key, value in counts.items():
+                truth[key] += value
+    total = truth['pi_plus'] + truth['pi_minus']
+    truth['asymmetry'] = (truth['pi_plus'] - truth['pi_minus']) / total if total else 0.0
+    return truth
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic Set files with a known pion asymmetry")
+    parser.add_argument("output", help="directory for output-Set<i>.txt")
+    parser.add_argument("--sets", type=int, default=10, help="files to write, output-Set1 .. output-SetN")
+    parser.add_argument("--events", type=int, default=100000, help="events per file")
+    parser.add_argument("--multiplicity", type=parse_multiplicity, default=("poisson", 15.0),
+                        help="particles per event: poisson:MEAN, negbin:MEAN:K or fixed:N (default poisson:15)")
+    parser.add_argument("--asymmetry", type=float, default=0.0,
+                        help="injected (N+ - N-) / (N+ + N-) of the charged pions")
+    parser.add_argument("--momentum-sigma", type=float, default=1.0, help="spread of px, py, pz")
+    parser.add_argument("--seed", type=int, default=0, help="file i uses seed + i")
+    parser.add_argument("--compress", choices=("gz", "xz"), help="write .txt.gz / .txt.xz files")
+    parser.add_argument("--workers", type=int, default=1, help="processes generating blocks")
+    parser.add_argument("--truth", help="write the injected parameters and realised counts as JSON")
+    args = parser.parse_args()
+
+    if not -1 <= args.asymmetry <= 1:
+        parser.error("--asymmetry must be within [-1, 1]")
+    os.makedirs(args.output, exist_ok=True)
+    start_time = time.time()
+    truths = {}
+    total_bytes = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for i in range(1, args.sets + 1):
+            path = os.path.join(args.output, f"output-Set{i}.txt" + (f".{args.compress}" if args.compress else ""))
+            truths[path] = write_set_file(path, args.events, args.multiplicity, args.asymmetry,
+                                          args.momentum_sigma, args.seed + i, executor if args.workers > 1 else None)
+            total_bytes += os.path.getsize(path)
+            truth = truths[path]
+            print(f"[INFO] {path}: {truth['events']} events, {truth['particles']} particles, "
+                  f"asymmetry {truth['asymmetry']:+.5f}")
+    elapsed = time.time() - start_time
+    print(f"[INFO] {total_bytes / 1e6:.1f} MB in {elapsed:.2f} seconds ({total_bytes / 1e6 / elapsed:.1f} MB/s)")
+    if args.truth:
+        with open(args.truth, "w") as f:
+            json.dump({'injected': {'asymmetry': args.asymmetry, 'multiplicity': list(args.multiplicity),
+                                    'momentum_sigma': args.momentum_sigma, 'seed': args.seed},
+                       'files': truths}, f, indent=2)
+        print(f"[INFO] Truth written to {args.truth}")